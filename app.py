@@ -1,54 +1,170 @@
-from flask import Flask, render_template, request, redirect, url_for
-import pandas as pd
-from model import collaborative_filtering, content_based_filtering
+import json
+import logging
+import os
+from functools import partial
+from flask import Flask, Response, g, render_template, request, redirect, url_for, jsonify
+import numpy as np
+from model import recommend_candidates, recommend_users_to_follow
+from indexes import DataIndex, content_in_order, content_subset
+from people import PeopleIndex
+from store import TABLES, DataStore, open_tables
+from similarity import ItemSimilarity
+from ranking import Ranker, interest_set
+from ingest import Ingestor, Snapshot
+from artifacts import ModelReloader, current_version, load_current
+from cache import cache_from_env
+from candidates import CandidatePools
+from embeddings import load_retriever
+from metrics import REGISTRY, profiler_from_env
+from batch import ALGORITHMS, BatchScorer
+from serving import service_from_env
+
+try:
+    import orjson  # optional: several times faster JSON encoding for the API routes
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 
-# Load data
-users = pd.read_csv('users.csv')
-content = pd.read_csv('content.csv')
-interactions = pd.read_csv('interactions.csv')
-browsing_history = pd.read_csv('browsing_history.csv')
+# Levelled logging instead of prints; LOG_LEVEL=DEBUG shows per-request detail
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# Read-only instances (READ_ONLY=1, e.g. several gunicorn workers) refuse events and signups;
+# they follow the tables a separate ingest instance appends to through model reloads
+READ_ONLY = os.environ.get('READ_ONLY') == '1'
+
+# Load data: the memory-mapped columnar store when one has been built
+# (python store.py build), otherwise the CSVs in DATA_DIR
+tables = open_tables(os.environ.get('DATA_STORE', 'data_store'), os.environ.get('DATA_DIR', '.'))
+# Tail rows are concatenated onto the mmapped columns, copying them into private memory; the
+# instance that ingests folds them in first so workers share the store's pages again
+if isinstance(tables, DataStore) and not READ_ONLY and os.environ.get('COMPACT_ON_START', '1') == '1':
+    tables.compact()
+users, content, interactions, browsing_history = tables.frames()
+
+POOLS_REFRESH_SECONDS = float(os.environ.get('POOLS_REFRESH_SECONDS', '5.0'))
+EMBEDDINGS_DIR = os.environ.get('EMBEDDINGS_DIR', 'embeddings')
+# Prebuilt, versioned model (python artifacts.py build); without one everything is built here
+MODEL_DIR = os.environ.get('MODEL_DIR', 'model_artifacts')
+
+def _model_snapshot(model, frames, since=None):
+    # The artifact's own embeddings when it has them, otherwise those in EMBEDDINGS_DIR
+    retriever = load_retriever(EMBEDDINGS_DIR, frames[1]) if model.retriever is None else None
+    return model.snapshot(*frames, since=since, retriever=retriever, pools_refresh=POOLS_REFRESH_SECONDS)
+
+def _build_snapshot():
+    return Snapshot(
+        users, content, interactions, browsing_history,
+        # Per-user / per-item lookups so requests never rescan the tables above
+        index=DataIndex(users, content, interactions, browsing_history),
+        # Item-item cosine neighbours for collaborative filtering
+        engine=ItemSimilarity(interactions),
+        # Interest -> users index and parsed follow graph for users-to-follow
+        people=PeopleIndex(users),
+        ranker=Ranker(content),
+        # Popularity rankings and per-category pools, refreshed in the background
+        pools=CandidatePools(content, interactions, browsing_history, refresh_interval=POOLS_REFRESH_SECONDS),
+        # Embedding neighbours for content-based filtering, when built (python embeddings.py build)
+        retriever=load_retriever(EMBEDDINGS_DIR, content),
+    )
 
-def _user_exists(user_id: int) -> bool:
+model_version = current_version(MODEL_DIR)
+snapshot = None
+if model_version is not None:
     try:
-        return not users.empty and (users['user_id'] == user_id).any()
+        snapshot = _model_snapshot(load_current(MODEL_DIR), (users, content, interactions, browsing_history))
     except Exception:
-        return False
-
-def recommend_users_to_follow(user_id, users, interactions):
-    # Get the interests of the target user
-    if not _user_exists(user_id):
-        return []
-    user_interests = users.loc[users['user_id'] == user_id, 'interests'].values[0].split(';')
-    user_following = users.loc[users['user_id'] == user_id, 'following'].values[0].split(';')
-    user_following = set(map(int, user_following))  # Convert to set of ints for easy comparison
-
-    # Find users with similar interests, exclude already followed users
-    similar_users = users[users['user_id'] != user_id].copy()  # Exclude current user
-    similar_users['similar_interest_score'] = similar_users['interests'].apply(
-        lambda interests: len(set(interests.split(';')).intersection(user_interests))
-    )
-
-    # Filter out users already followed and sort by interest score and follower count
-    recommended_users = similar_users[~similar_users['user_id'].isin(user_following)]
-    recommended_users = recommended_users[recommended_users['similar_interest_score'] > 0]
-    recommended_users = recommended_users.sort_values(by=['similar_interest_score', 'followers_count'], ascending=[False, False])
-
-    # Get top 5 recommended users
-    recommended_users = recommended_users[['user_id', 'name', 'followers_count', 'following', 'interests']].head(5)
-
-    # Preprocess following names (split 'following' IDs and map to names)
-    recommended_users['following_names'] = recommended_users['following'].apply(
-        lambda following: [users.loc[users['user_id'] == int(follow_id), 'name'].values[0] 
-                           for follow_id in following.split(';')] if following else []
-    )
+        logger.exception("Model artifact %s unusable; building in-process", model_version)
+ingestor = Ingestor(snapshot if snapshot is not None else _build_snapshot(), tables,
+                    flush_interval=float(os.environ.get('INGEST_FLUSH_SECONDS', '1.0')))
+
+def start_background():
+    # Ingestion flush, pool refresh and model reload threads. Threads do not survive fork, so
+    # under a pre-fork server (gunicorn.conf.py) each worker calls this itself
+    ingestor.start()
+    ingestor.snapshot.pools.start()
+    reloader.start()
+
+# Per-user results; dropped for a user as soon as their events arrive
+recommendation_cache = cache_from_env()
+ingestor.subscribe(recommendation_cache.invalidate)
+if model_version is not None:
+    # Results from another model version are never served
+    recommendation_cache.prefix = f'rec:{model_version}'
+
+# Coalesces concurrent misses; optionally scores on forked processes (SCORING_WORKERS)
+# and answers with the popularity list past REQUEST_DEADLINE_MS
+service = service_from_env(recommendation_cache)
+if service.pool is not None:
+    ingestor.subscribe(service.pool.mark_dirty)
+
+def _swap_model(model):
+    # Runs on the reloader thread once the artifact is loaded and verified. The frames
+    # loaded at startup stay (shared with forked workers); only rows appended since are read
+    frames = (users, content, interactions, browsing_history)
+    read = {}
+
+    def build():
+        since = {table: tables.rows_since(table, len(frame)) for table, frame in zip(TABLES, frames)}
+        read.update((table, len(frame) + len(since[table])) for table, frame in zip(TABLES, frames))
+        return _model_snapshot(model, frames, since)
+
+    def catch_up():
+        # Rows persisted while build() ran; ingestion is paused for this read
+        return {table: tables.rows_since(table, read[table]) for table in TABLES if table != 'content'}
+
+    old = ingestor.swap(build, catch_up)
+    recommendation_cache.prefix = f'rec:{model.version}'
+    old.pools.stop()
+    ingestor.snapshot.pools.start()
+    if service.pool is not None:
+        service.pool.recycle()
+    REGISTRY.inc('model_reloads_total')
+    logger.warning("Serving model %s", model.version)
+
+# Hot-swaps to the version named by MODEL_DIR/CURRENT when it changes or on SIGHUP
+reloader = ModelReloader(MODEL_DIR, _swap_model, version=model_version,
+                         poll_interval=float(os.environ.get('MODEL_POLL_SECONDS', '5.0')))
+
+if os.environ.get('DEFER_BACKGROUND') != '1':
+    start_background()
+
+def _cache_metrics():
+    # Read at scrape time from the cache's own totals (whichever cache is current)
+    stats = service.cache.stats()
+    yield 'recommend_cache_hits_total', 'counter', stats['hits']
+    yield 'recommend_cache_misses_total', 'counter', stats['misses']
+    yield 'recommend_cache_invalidations_total', 'counter', stats['invalidations']
+    yield 'recommend_cache_evictions_total', 'counter', stats['evictions']
+    yield 'recommend_cache_bytes', 'gauge', stats['bytes']
+    yield 'recommend_cache_entries', 'gauge', stats['entries']
+
+REGISTRY.add_collector(_cache_metrics)
+
+# cProfile for sampled (PROFILE_SAMPLE_RATE) or opted-in (PROFILE_REQUESTS=1, ?profile=1) requests
+profiler = profiler_from_env()
+
+@app.before_request
+def _start_profile():
+    if profiler.enabled:
+        g.profiler = profiler.start(request.args.get('profile') == '1')
+
+@app.after_request
+def _stop_profile(response):
+    path = profiler.stop(g.pop('profiler', None), request.path)
+    if path:
+        response.headers['X-Profile'] = path
+    return response
+
+@app.teardown_request
+def _stop_profile_on_error(exc):
+    # after_request is skipped when a view raises; still stop, or the profiler stays busy
+    profiler.stop(g.pop('profiler', None), request.path)
 
-    # Clean the 'interests' by replacing semicolons with commas (and adding a space after commas)
-    recommended_users['interests'] = recommended_users['interests'].apply(lambda interests: interests.replace(';', ', ') if interests else '')
-
-    # Convert to a list of dictionaries for template rendering
-    return recommended_users.to_dict(orient='records')
+def _user_exists(user_id: int) -> bool:
+    return ingestor.snapshot.index.has_user(user_id)
 
 def _interest_options_from_data(users_df, content_df):
     user_interests = set()
@@ -68,29 +184,19 @@ def _interest_options_from_data(users_df, content_df):
     return merged
 
 def _create_user(name, interests_list):
-    global users
-    new_id = int(users['user_id'].max()) + 1 if not users.empty else 1
-    interests_str = ';'.join([i.strip().lower() for i in interests_list if i.strip()])
-    following_default = '1' if (not users.empty and (users['user_id'] == 1).any()) else ''
-    new_row = {
-        'user_id': new_id,
-        'name': name,
-        'interests': interests_str,
-        'followers_count': 0,
-        'following': following_default,
-        'activity_level': 'low'
-    }
-    users = pd.concat([users, pd.DataFrame([new_row])], ignore_index=True)
-    users.to_csv('users.csv', index=False)
-    return new_id
+    # Appends the row to the users table and adds the user to the live indexes
+    return ingestor.signup(name, interests_list)
 
 @app.route('/signup', methods=['GET'])
 def signup_page():
-    interest_options = _interest_options_from_data(users, content)
+    snap = ingestor.snapshot
+    interest_options = _interest_options_from_data(snap.users, snap.content)
     return render_template('signup.html', interest_options=interest_options)
 
 @app.route('/api/signup', methods=['POST'])
 def api_signup():
+    if READ_ONLY:
+        return "Signups are disabled on this read-only instance", 403
     name = request.form.get('name', '').strip()
     interests_selected = request.form.getlist('interests')
     if not name:
@@ -109,67 +215,11 @@ def recommend_auto():
     if not _user_exists(user_id):
         return "User does not exist", 200
 
-    interacted_content_ids = interactions[interactions['user_id'] == user_id]['content_id'].unique()
-    browsed_content_ids = browsing_history[browsing_history['user_id'] == user_id]['content_id'].unique()
-
-    interacted_content_df = content[content['content_id'].isin(interacted_content_ids) | content['content_id'].isin(browsed_content_ids)]
-
-    if algorithm == 'collaborative':
-        recommendations = collaborative_filtering(user_id, interactions, content, users)
-    elif algorithm == 'content-based':
-        recommendations = content_based_filtering(user_id, interactions, browsing_history, content)
-    else:
-        collaborative_recommendations = collaborative_filtering(user_id, interactions, content, users)
-        content_based_recommendations = content_based_filtering(user_id, interactions, browsing_history, content)
-        recommendations = pd.concat([collaborative_recommendations, content_based_recommendations]).drop_duplicates()
-
-    if 'content_id' not in recommendations.columns:
-        return "Error: 'content_id' column is missing."
-
-    recommended_content_df = recommendations[~recommendations['content_id'].isin(interacted_content_ids) &
-                                            ~recommendations['content_id'].isin(browsed_content_ids)]
-
-    interacted_content_df = interacted_content_df[['content_id', 'title', 'category', 'popularity']].copy()
-    interacted_content_df['source'] = interacted_content_df['content_id'].apply(
-        lambda x: 'Interacted' if x in interacted_content_ids else 'Browsed'
-    )
-
-    # Keep original source if present; default to 'Recommended'
-    if 'source' in recommended_content_df.columns:
-        recommended_content_df = recommended_content_df[['content_id', 'title', 'category', 'popularity', 'source']].copy()
-    else:
-        recommended_content_df = recommended_content_df[['content_id', 'title', 'category', 'popularity']].copy()
-        recommended_content_df['source'] = 'Recommended'
-
-    # Ranking: similarity to user's interests + popularity normalization
-    user_interests_raw = users.loc[users['user_id'] == user_id, 'interests'].astype(str).values
-    user_interest_set = set()
-    if len(user_interests_raw) > 0:
-        user_interest_set = set([t.strip().lower() for t in user_interests_raw[0].split(';') if t.strip()])
-
-    max_pop = content['popularity'].max() if 'popularity' in content.columns and not content.empty else 1
-    def _score_row(row):
-        cat = str(row.get('category', '')).strip().lower()
-        sim = 1.0 if cat in user_interest_set else 0.0
-        pop = float(row.get('popularity', 0)) / float(max_pop or 1)
-        # optional source boost: CF > CBF > others
-        src = str(row.get('source', '')).lower()
-        src_boost = 0.2 if 'collaborative' in src else (0.1 if 'content-based' in src else 0.0)
-        return 2.0 * sim + 1.0 * pop + src_boost
-
-    recommended_content_df['score'] = recommended_content_df.apply(_score_row, axis=1)
-    recommended_content_df = recommended_content_df.sort_values(by=['score', 'popularity'], ascending=[False, False]).drop(columns=['score'])
-
-    users_to_follow = recommend_users_to_follow(user_id, users, interactions)
-
-    return render_template('recommendations.html',
-                           interacted_content=interacted_content_df.to_dict(orient='records'),
-                           recommended_content=recommended_content_df.to_dict(orient='records'),
-                           users_to_follow=users_to_follow)
+    return _render_recommendations(user_id, algorithm)
 
 @app.route('/')
 def index():
-    return render_template('index.html', content=content.to_dict(orient='records'))
+    return render_template('index.html', content=ingestor.snapshot.content.to_dict(orient='records'))
 
 @app.route('/recommend', methods=['POST'])
 def get_recommendations():
@@ -182,70 +232,219 @@ def get_recommendations():
     if not _user_exists(user_id):
         return "User does not exist", 200
 
-    # Get content IDs the user has interacted with
-    interacted_content_ids = interactions[interactions['user_id'] == user_id]['content_id'].unique()
-    browsed_content_ids = browsing_history[browsing_history['user_id'] == user_id]['content_id'].unique()
+    return _render_recommendations(user_id, algorithm)
 
-    # Content the user has already interacted with
-    interacted_content = content[content['content_id'].isin(interacted_content_ids) | content['content_id'].isin(browsed_content_ids)]
-
-    # Generate recommendations based on the selected algorithm
-    if algorithm == 'collaborative':
-        recommendations = collaborative_filtering(user_id, interactions, content, users)
-    elif algorithm == 'content-based':
-        recommendations = content_based_filtering(user_id, interactions, browsing_history, content)
-    elif algorithm == 'hybrid':
-        collaborative_recommendations = collaborative_filtering(user_id, interactions, content, users)
-        content_based_recommendations = content_based_filtering(user_id, interactions, browsing_history, content)
-        recommendations = pd.concat([collaborative_recommendations, content_based_recommendations]).drop_duplicates()
-
-    # Ensure 'content_id' column exists before proceeding
-    if 'content_id' not in recommendations.columns:
-        print("Warning: 'content_id' column is missing from recommendations.")
-        return "Error: 'content_id' column is missing."
-
-    # Exclude content the user has already interacted with
-    recommended_content = recommendations[~recommendations['content_id'].isin(interacted_content_ids) &
-                                          ~recommendations['content_id'].isin(browsed_content_ids)]
-
-    # Prepare data for rendering
-    interacted_content = interacted_content[['content_id', 'title', 'category', 'popularity']].copy()
-    interacted_content['source'] = interacted_content['content_id'].apply(
-        lambda x: 'Interacted' if x in interacted_content_ids else 'Browsed'
-    )
+def _render_recommendations(user_id, algorithm):
+    REGISTRY.inc('recommend_requests_total', algorithm=algorithm)
+    result, _ = service.get(user_id, algorithm, None, partial(_compute_recommendations, user_id, algorithm),
+                            fallback=lambda: _fallback_recommendations(user_id))
+    with REGISTRY.time('render'):
+        return render_template('recommendations.html', **result)
 
-    # Keep original source if present; default to 'Recommended'
-    if 'source' in recommended_content.columns:
-        recommended_content = recommended_content[['content_id', 'title', 'category', 'popularity', 'source']].copy()
-    else:
-        recommended_content = recommended_content[['content_id', 'title', 'category', 'popularity']].copy()
-        recommended_content['source'] = 'Recommended'
-
-    # Ranking: similarity to user's interests + popularity normalization
-    user_interests_raw = users.loc[users['user_id'] == user_id, 'interests'].astype(str).values
-    user_interest_set = set()
-    if len(user_interests_raw) > 0:
-        user_interest_set = set([t.strip().lower() for t in user_interests_raw[0].split(';') if t.strip()])
-
-    max_pop = content['popularity'].max() if 'popularity' in content.columns and not content.empty else 1
-    def _score_row2(row):
-        cat = str(row.get('category', '')).strip().lower()
-        sim = 1.0 if cat in user_interest_set else 0.0
-        pop = float(row.get('popularity', 0)) / float(max_pop or 1)
-        src = str(row.get('source', '')).lower()
-        src_boost = 0.2 if 'collaborative' in src else (0.1 if 'content-based' in src else 0.0)
-        return 2.0 * sim + 1.0 * pop + src_boost
-
-    recommended_content['score'] = recommended_content.apply(_score_row2, axis=1)
-    recommended_content = recommended_content.sort_values(by=['score', 'popularity'], ascending=[False, False]).drop(columns=['score'])
+def _compute_recommendations(user_id, algorithm):
+    # One snapshot for the whole request: the CF engine and people index stay the ones it
+    # started with even if ingestion swaps in new ones; index and pools update in place
+    snap = ingestor.snapshot
+    interacted_content = _seen_content(snap, user_id)
+    recommended_content = _ranked_recommendations(snap, user_id, algorithm)
 
     # Get users to follow based on recommendations
-    users_to_follow = recommend_users_to_follow(user_id, users, interactions)
+    users_to_follow = recommend_users_to_follow(user_id, snap.users, snap.interactions, people=snap.people)
 
-    return render_template('recommendations.html', 
-                       interacted_content=interacted_content.to_dict(orient='records'),
-                       recommended_content=recommended_content.to_dict(orient='records'),
-                       users_to_follow=users_to_follow)
+    return {'interacted_content': interacted_content.to_dict(orient='records'),
+            'recommended_content': recommended_content.to_dict(orient='records'),
+            'users_to_follow': users_to_follow}
+
+RECORD_COLUMNS = ['content_id', 'title', 'category', 'popularity', 'source']
+
+def _seen_content(snap, user_id):
+    index = snap.index
+
+    # Get content IDs the user has interacted with
+    interacted_content_ids = index.interacted(user_id)
+    browsed_content_ids = index.browsed(user_id)
+
+    # Content the user has already interacted with
+    interacted_content = content_subset(np.concatenate([interacted_content_ids, browsed_content_ids]), snap.content, index)
+    interacted_content = interacted_content[['content_id', 'title', 'category', 'popularity']].copy()
+    interacted_content['source'] = np.where(interacted_content['content_id'].isin(interacted_content_ids), 'Interacted', 'Browsed')
+    return interacted_content
+
+def _trending_fallback(snap, user_id, n):
+    # Unseen trending items (time-decayed browsing), topped up with the most interacted-with:
+    # both are precomputed, so cheap enough to serve past a deadline
+    seen = np.concatenate([snap.index.interacted(user_id), snap.index.browsed(user_id)])
+    trending = snap.pools.trending_ids(n + len(seen))
+    trending = trending[~np.isin(trending, seen)][:n]
+    popular = snap.pools.popular_ids(n + len(seen) + len(trending))
+    popular = popular[~np.isin(popular, np.concatenate([seen, trending]))][:n - len(trending)]
+    items = content_in_order(np.concatenate([trending, popular]), snap.content, snap.index)
+    source = np.where(items['content_id'].isin(trending), 'Trending Content Fallback', 'Popular Content Fallback')
+    return items[RECORD_COLUMNS[:-1]].assign(source=source)
+
+def _fallback_recommendations(user_id):
+    snap = ingestor.snapshot
+    return {'interacted_content': _seen_content(snap, user_id).to_dict(orient='records'),
+            'recommended_content': _records(_trending_fallback(snap, user_id, DEFAULT_PAGE_SIZE)),
+            'users_to_follow': []}
+
+def _ranked_recommendations(snap, user_id, algorithm, limit=None, distinct=False):
+    # Generate recommendations based on the selected algorithm, excluding content already seen
+    recommended_content = recommend_candidates(user_id, algorithm, snap.interactions, snap.browsing_history, snap.content,
+                                               snap.users, index=snap.index, engine=snap.engine, pools=snap.pools,
+                                               retriever=snap.retriever)
+    recommended_content = recommended_content[RECORD_COLUMNS]
+    for source, count in recommended_content['source'].value_counts().items():
+        REGISTRY.inc('recommend_candidates_total', int(count), source=source)
+
+    # Ranking: similarity to user's interests + popularity normalization; top `limit` only if given
+    with REGISTRY.time('ranking'):
+        user_interests = interest_set(snap.index.user_row(user_id)['interests'])
+        return snap.ranker.rank(recommended_content, user_interests, limit=limit, distinct=distinct)
+
+# JSON API: ranked items only, cut to the requested page before anything is serialized
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BULK_USERS = 1000
+
+def _records(frame):
+    # Column-wise tolist() gives plain Python scalars without a per-row to_dict(orient='records')
+    columns = []
+    for name in RECORD_COLUMNS:
+        column = frame[name]
+        if column.dtype == object and column.hasnans:
+            column = column.where(column.notna(), None)
+        columns.append(column.tolist())
+    return [dict(zip(RECORD_COLUMNS, row)) for row in zip(*columns)]
+
+def _json(payload, status=200):
+    body = orjson.dumps(payload) if orjson is not None else json.dumps(payload, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+def _int_arg(value, name, default, low, high):
+    if value is None or value == '':
+        return default
+    # Only ints and numeric strings: int() would also take true as 1 and truncate 1.7 to 1
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def _algorithm_arg(value):
+    algorithm = value or 'hybrid'
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"algorithm must be one of {ALGORITHMS}")
+    return algorithm
+
+@app.route('/api/v1/recommendations', methods=['GET'])
+def api_recommendations():
+    # cursor is the offset of the page, returned as next_cursor; treat it as opaque
+    try:
+        user_id = _int_arg(request.args.get('user_id'), 'user_id', None, 0, 2 ** 63 - 1)
+        if user_id is None:
+            raise ValueError("user_id is required")
+        algorithm = _algorithm_arg(request.args.get('algorithm'))
+        limit = _int_arg(request.args.get('limit'), 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        offset = _int_arg(request.args.get('cursor'), 'cursor', 0, 0, 2 ** 31 - 1)
+    except ValueError as e:
+        return _json({'error': str(e)}, 400)
+    if not _user_exists(user_id):
+        return _json({'error': f"unknown user_id {user_id}"}, 404)
+
+    REGISTRY.inc('api_recommend_requests_total', algorithm=algorithm)
+    # Only the ranked prefix up to this page is computed and cached, plus one item to tell
+    # whether another page exists
+    depth = offset + limit
+    items, complete = service.get(user_id, algorithm, depth + 1, partial(_api_items, user_id, algorithm, depth + 1),
+                                  fallback=lambda: _records(_trending_fallback(ingestor.snapshot, user_id, depth)))
+    page = items[offset:depth]
+    # A degraded page comes from the fallback list: paging on from it would mix two rankings
+    next_cursor = str(depth) if complete and len(items) > depth else None
+    return _json({'user_id': user_id, 'algorithm': algorithm, 'items': page, 'next_cursor': next_cursor,
+                  'degraded': not complete})
+
+def _api_items(user_id, algorithm, depth):
+    # Pages count distinct items: hybrid candidates found by both CF and CBF appear once
+    return _records(_ranked_recommendations(ingestor.snapshot, user_id, algorithm, depth, distinct=True))
+
+_bulk_scorer = (None, None)  # (snapshot, BatchScorer) for the bulk endpoint
+
+def _scorer(snap, algorithm):
+    # Rebuilt only when ingestion publishes a new snapshot (new CF engine or signups)
+    global _bulk_scorer
+    cached_snap, scorers = _bulk_scorer
+    if cached_snap is not snap:
+        scorers = {}
+        _bulk_scorer = (snap, scorers)
+    scorer = scorers.get(algorithm)
+    if scorer is None:
+        scorer = scorers[algorithm] = BatchScorer(snap.users, snap.content, snap.interactions, None, algorithm,
+                                                  DEFAULT_PAGE_SIZE, snap.index, snap.engine, snap.ranker, snap.pools,
+                                                  snap.retriever)
+    return scorer
+
+@app.route('/api/v1/recommendations/bulk', methods=['POST'])
+def api_recommendations_bulk():
+    # {"user_ids": [1, 2, ...], "algorithm": "hybrid", "limit": 20}: top `limit` for each user,
+    # scored together in one vectorized pass (batch.BatchScorer) instead of one route call per user
+    body = request.get_json(force=True, silent=True)
+    try:
+        if not isinstance(body, dict) or not isinstance(body.get('user_ids'), list):
+            raise ValueError("body must be a JSON object with a user_ids list")
+        algorithm = _algorithm_arg(body.get('algorithm'))
+        limit = _int_arg(body.get('limit'), 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        user_ids = [_int_arg(u, 'user_ids', None, 0, 2 ** 63 - 1) for u in body['user_ids']]
+        if len(user_ids) > MAX_BULK_USERS:
+            raise ValueError(f"at most {MAX_BULK_USERS} user_ids per request")
+    except ValueError as e:
+        return _json({'error': str(e)}, 400)
+
+    user_ids = list(dict.fromkeys(user_ids))
+    known = [u for u in user_ids if u is not None and _user_exists(u)]
+    unknown = [u for u in user_ids if u is None or not _user_exists(u)]
+    REGISTRY.inc('api_bulk_users_total', len(known), algorithm=algorithm)
+
+    def score(missing):
+        snap = ingestor.snapshot
+        with REGISTRY.time('bulk_scoring'):
+            frame = _scorer(snap, algorithm).score_chunk(missing, top_n=limit)
+        items = {user_id: [] for user_id in missing}
+        records = _records(frame)
+        for user_id, record in zip(frame['user_id'].tolist(), records):
+            items[user_id].append(record)
+        return items
+
+    results = service.cache.get_or_compute_many(known, algorithm, limit, score)
+    return _json({'algorithm': algorithm,
+                  'results': [{'user_id': user_id, 'items': results[user_id]} for user_id in known],
+                  'unknown_user_ids': unknown})
+
+@app.route('/api/events', methods=['POST'])
+def api_events():
+    # A JSON event, a JSON list of events, or newline-delimited JSON (application/x-ndjson)
+    if READ_ONLY:
+        return jsonify({'error': 'this instance is read-only'}), 403
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            events = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            events = request.get_json(force=True, silent=True)
+            if events is None:
+                raise ValueError("body must be a JSON event or a list of events")
+            events = events if isinstance(events, list) else [events]
+        return jsonify(ingestor.ingest(events))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server; for production run it pre-forked: gunicorn -c gunicorn.conf.py app:app
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1', threaded=True)
\ No newline at end of file
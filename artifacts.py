@@ -0,0 +1,310 @@
+"""Versioned, checksummed model artifacts: everything derived from the tables, built once.
+
+    python artifacts.py build --data-dir . --root model_artifacts [--embeddings]
+    python artifacts.py list --root model_artifacts
+    python artifacts.py activate 20250101-120000-1a2b3c4d --root model_artifacts   # roll back / forward
+    python artifacts.py verify 20250101-120000-1a2b3c4d --root model_artifacts
+
+A version directory holds the pickled DataIndex, ItemSimilarity, PeopleIndex,
+CandidatePools and Ranker, optionally an embedding index (embeddings.py
+format, memory-mapped on load), and a manifest with a SHA-256 of every file
+and the row count of every table it was built from. The CURRENT file names
+the active version; it is replaced atomically, and a running app that sees it
+change (or gets SIGHUP) loads the new version and swaps it in.
+
+Rows appended to the tables after the build (live ingestion) are replayed on
+load, so an artifact never hides events from the app.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import signal
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from candidates import CandidatePools
+from embeddings import EmbeddingIndex
+from indexes import DataIndex
+from ingest import Snapshot, apply_rows
+from people import PeopleIndex
+from ranking import Ranker
+from similarity import ItemSimilarity
+from store import TABLES, open_tables
+
+logger = logging.getLogger(__name__)
+
+CURRENT = 'CURRENT'
+MANIFEST = 'manifest.json'
+COMPONENTS = ('index', 'engine', 'people', 'pools', 'ranker')
+FORMAT_VERSION = 2
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _catalogue_digest(content):
+    # Artifacts are only valid for the catalogue they were built from (content is never ingested)
+    return hashlib.sha256(np.ascontiguousarray(content['content_id'].to_numpy(dtype=np.int64)).tobytes()).hexdigest()
+
+
+def _files(path):
+    for directory, _, names in os.walk(path):
+        for name in names:
+            if name != MANIFEST:
+                yield os.path.relpath(os.path.join(directory, name), path)
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(root, version):
+    """Point CURRENT at version (atomic rename, so readers see the old or the new name)."""
+    if not os.path.isfile(os.path.join(root, version, MANIFEST)):
+        raise ValueError(f"No artifact {version!r} in {root}")
+    tmp = os.path.join(root, CURRENT + '.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+
+def list_versions(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root) if os.path.isfile(os.path.join(root, v, MANIFEST)))
+
+
+def build_artifact(frames, root='model_artifacts', embeddings=False, activate_it=True, keep=5):
+    """Compile (users, content, interactions, browsing_history) into a new version; returns its name."""
+    users, content, interactions, browsing_history = frames
+    started = time.perf_counter()
+    index = DataIndex(users, content, interactions, browsing_history)
+    components = {
+        # The users frame is the app's own at load time; the artifact keeps only the lookups
+        'index': copy.copy(index),
+        'engine': ItemSimilarity(interactions),
+        'people': PeopleIndex(users),
+        'pools': CandidatePools(content, interactions, browsing_history),
+        'ranker': Ranker(content),
+    }
+    components['index'].users = None
+
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f'.build-{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, value in components.items():
+        with open(os.path.join(tmp_dir, name + '.pkl'), 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    if embeddings:
+        EmbeddingIndex.build(content).save(os.path.join(tmp_dir, 'embeddings'))
+
+    checksums = {name: _sha256(os.path.join(tmp_dir, name)) for name in sorted(_files(tmp_dir))}
+    version = time.strftime('%Y%m%d-%H%M%S') + '-' + hashlib.sha256(
+        json.dumps(checksums, sort_keys=True).encode()).hexdigest()[:8]
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'build_seconds': round(time.perf_counter() - started, 2),
+        'rows': {table: len(frame) for table, frame in zip(TABLES, frames)},
+        'catalogue': _catalogue_digest(content),
+        'files': checksums,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    if os.path.isdir(os.path.join(root, version)):
+        # Same second, same files: that version already exists
+        shutil.rmtree(tmp_dir)
+    else:
+        os.replace(tmp_dir, os.path.join(root, version))
+
+    if activate_it:
+        activate(root, version)
+    _prune(root, keep)
+    return version
+
+
+def _prune(root, keep):
+    # Oldest versions go first; the active one always stays
+    active = current_version(root)
+    versions = [v for v in list_versions(root) if v != active]
+    for version in versions[:max(0, len(versions) - max(keep - 1, 0))]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def verify(path):
+    """The manifest of the artifact at path; ValueError if any file is missing or does not match it."""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported artifact format {manifest.get('format')!r}")
+    for name, digest in manifest['files'].items():
+        file_path = os.path.join(path, name)
+        if not os.path.isfile(file_path) or _sha256(file_path) != digest:
+            raise ValueError(f"{path}: checksum mismatch for {name}")
+    return manifest
+
+
+class ModelArtifact:
+    """A loaded version: the unpickled components, ready to be bound to the live tables."""
+
+    def __init__(self, path, verify_checksums=True):
+        self.path = path
+        if verify_checksums:
+            self.manifest = verify(path)
+        else:
+            with open(os.path.join(path, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.components = {}
+        for name in COMPONENTS:
+            with open(os.path.join(path, name + '.pkl'), 'rb') as f:
+                self.components[name] = pickle.load(f)
+        embeddings_dir = os.path.join(path, 'embeddings')
+        self.retriever = EmbeddingIndex.load(embeddings_dir) if os.path.isdir(embeddings_dir) else None
+
+    def snapshot(self, users, content, interactions, browsing_history, since=None, retriever=None,
+                 pools_refresh=None):
+        """Snapshot over the given frames, with every row added since the build replayed.
+
+        since maps a table to the rows appended after its frame (store.py
+        rows_since()), so the frames can be the ones already loaded, shared
+        copy-on-write, rather than a fresh read. Raises ValueError if the
+        tables are not a continuation of the ones the artifact was built from.
+        """
+        rows = self.manifest['rows']
+        since = since or {}
+        frames = dict(zip(TABLES, (users, content, interactions, browsing_history)))
+        if _catalogue_digest(content) != self.manifest['catalogue']:
+            raise ValueError(f"artifact {self.version} was built for a different content catalogue")
+        replay = {}
+        for table, frame in frames.items():
+            after = since.get(table)
+            available = len(frame) + (0 if after is None else len(after))
+            if available < rows[table]:
+                raise ValueError(f"artifact {self.version} has {rows[table]} {table} rows, the table only {available}")
+            # Rows at positions rows[table].. of the frame followed by the appended ones
+            parts = [frame.iloc[rows[table]:]]
+            if after is not None:
+                parts.append(after.iloc[max(0, rows[table] - len(frame)):])
+            replay[table] = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+        # Unpickled objects are private to this load, so the replay may update them in place
+        index = self.components['index']
+        index.users = users
+        if rows['users'] > len(users):
+            # Built after signups this users frame does not hold: serve those rows from the index itself
+            for row in since['users'].iloc[:rows['users'] - len(users)].to_dict(orient='records'):
+                del index.user_rows[row['user_id']]
+                index.add_user(row['user_id'], row)
+        pools = self.components['pools']
+        pools.refresh_interval = pools_refresh
+        snap = Snapshot(users, content, interactions, browsing_history, index=index,
+                        engine=self.components['engine'], people=self.components['people'],
+                        ranker=self.components['ranker'], pools=pools,
+                        retriever=self.retriever if self.retriever is not None else retriever)
+
+        snap = apply_rows(snap, replay['interactions'], replay['browsing_history'],
+                          replay['users'].to_dict(orient='records'))
+        if len(replay['interactions']):
+            snap = snap.replace(engine=snap.engine.with_interactions(replay['interactions']))
+        return snap
+
+
+def load_current(root, verify_checksums=True):
+    """The active ModelArtifact under root, or None when nothing has been built."""
+    version = current_version(root)
+    return None if version is None else ModelArtifact(os.path.join(root, version), verify_checksums)
+
+
+class ModelReloader:
+    """Watches root/CURRENT and calls on_change(artifact) when it names a new version.
+
+    Checks every poll_interval seconds, or at once on SIGHUP (main thread
+    only). Loading and checksum verification happen on the watcher thread;
+    a version that fails to load is logged and skipped, and the app keeps
+    serving the one it has.
+    """
+
+    def __init__(self, root, on_change, version=None, poll_interval=5.0):
+        self.root = root
+        self.on_change = on_change
+        self.version = version
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+
+    def check(self):
+        version = current_version(self.root)
+        if version is None or version == self.version:
+            return False
+        try:
+            artifact = ModelArtifact(os.path.join(self.root, version))
+            self.on_change(artifact)
+        except Exception:
+            logger.exception("Could not load model artifact %s; still serving %s", version, self.version)
+        # Also on failure: do not retry a broken version on every poll
+        self.version = version
+        return True
+
+    def start(self):
+        def loop():
+            while True:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                self.check()
+
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._wake.set())
+        threading.Thread(target=loop, name='model-reload', daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, list, verify or activate model artifacts.")
+    parser.add_argument('command', choices=('build', 'list', 'activate', 'verify'))
+    parser.add_argument('version', nargs='?', help="activate / verify: the version to use")
+    parser.add_argument('--root', default='model_artifacts')
+    parser.add_argument('--data-dir', default='.', help="directory holding the four CSV files")
+    parser.add_argument('--store', default='data_store', help="columnar store used instead of the CSVs when present")
+    parser.add_argument('--embeddings', action='store_true', help="also build the embedding index")
+    parser.add_argument('--no-activate', action='store_true', help="build without making it CURRENT")
+    parser.add_argument('--keep', type=int, default=5, help="versions to keep, the active one included")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        frames = open_tables(args.store, args.data_dir).frames()
+        version = build_artifact(frames, args.root, args.embeddings, not args.no_activate, args.keep)
+        print(f"Built {version}" + ("" if args.no_activate else " (active)"))
+    elif args.command == 'list':
+        active = current_version(args.root)
+        for version in list_versions(args.root):
+            print(('* ' if version == active else '  ') + version)
+    elif not args.version:
+        parser.error(f"{args.command} needs a version")
+    elif args.command == 'activate':
+        activate(args.root, args.version)
+        print(f"Active: {args.version}")
+    else:
+        manifest = verify(os.path.join(args.root, args.version))
+        print(f"{args.version}: {len(manifest['files'])} files OK, rows {manifest['rows']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Offline recommendations for every user (or a given id list).
+
+Users are scored in chunks with sparse matrix products and the chunks are
+spread over a process pool; results stream to CSV or Parquet as they finish.
+Per-user output is the online routes' ranked list, cut to the top n.
+
+    python batch.py --algorithm hybrid --top-n 10 --workers 4 --output recommendations.parquet
+"""
+import argparse
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from candidates import CandidatePools, DEFAULT_POOL_SIZE
+from embeddings import load_retriever
+from indexes import DataIndex
+from model import _collaborative_frame, _content_based_frame, _combine_candidates, _with_neighbours
+from ranking import Ranker, interest_set
+from similarity import ItemSimilarity
+
+ALGORITHMS = ('collaborative', 'content-based', 'hybrid')
+OUTPUT_COLUMNS = ['user_id', 'rank', 'content_id', 'title', 'category', 'popularity', 'source']
+
+
+class BatchScorer:
+    """Scores chunks of users at once: the vectorized path behind batch.py and the bulk API.
+
+    Everything a worker needs is built once in the parent. With the fork start
+    method workers inherit it copy-on-write instead of unpickling a copy.
+    With browsing_history=None, each chunk's browsing is read from the index
+    instead, so a scorer kept by the app sees live browse events.
+    """
+
+    def __init__(self, users, content, interactions, browsing_history, algorithm, top_n, index, engine, ranker, pools,
+                 retriever=None):
+        self.content = content
+        self.retriever = retriever
+        self.interactions = interactions
+        self.algorithm = algorithm
+        self.top_n = top_n
+        self.index = index
+        self.engine = engine
+        self.ranker = ranker
+        self.pools = pools
+
+        # content row x category one-hot, and user x content row browsing matrix
+        categories, _ = pd.factorize(content['category'], use_na_sentinel=False)
+        n_items = len(content)
+        self.item_categories = sp.csr_matrix(
+            (np.ones(n_items, dtype=np.float32), (np.arange(n_items), categories)),
+            shape=(n_items, categories.max() + 1 if n_items else 0))
+        if browsing_history is None:
+            self.browse_users = self.browsing = None
+            return
+        positions = browsing_history['content_id'].map(index.content_rows)
+        known = positions.notna().to_numpy()
+        self.browse_users = pd.Index(browsing_history['user_id'].to_numpy()[known]).unique()
+        self.browsing = sp.csr_matrix(
+            (np.ones(known.sum(), dtype=np.float32),
+             (self.browse_users.get_indexer(browsing_history['user_id'].to_numpy()[known]),
+              positions.to_numpy()[known].astype(np.int64))),
+            shape=(len(self.browse_users), n_items))
+
+    def _browsed(self, user_ids):
+        # user_ids x content rows, 1.0 where the user browsed the item
+        if self.browsing is None:
+            positions = [self.index.content_positions(self.index.browsed(u)) for u in user_ids]
+            indptr = np.r_[0, np.cumsum([len(p) for p in positions])]
+            indices = np.concatenate(positions) if positions else np.array([], dtype=np.int64)
+            return sp.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                                 shape=(len(user_ids), self.item_categories.shape[0]))
+        rows = self.browse_users.get_indexer(user_ids)
+        known = np.flatnonzero(rows >= 0)
+        select = sp.csr_matrix((np.ones(len(known), dtype=np.float32), (known, rows[known])),
+                               shape=(len(user_ids), len(self.browse_users)))
+        browsed = (select @ self.browsing).tocsr()
+        browsed.data[:] = 1.0
+        return browsed
+
+    def content_based_positions(self, user_ids):
+        # Catalogue positions sharing a category with each user's browsing, minus the browsed items,
+        # cut to the top DEFAULT_POOL_SIZE of each category pool like CandidatePools.content_based_positions.
+        # None marks users with no browsed item in the catalogue (the online path returns an empty frame).
+        browsed = self._browsed(user_ids)
+        candidates = ((browsed @ self.item_categories) @ self.item_categories.T).tocsr()
+        candidates.data[:] = 1.0
+        candidates = (candidates - candidates.multiply(browsed)).tocsr()
+        candidates.eliminate_zeros()
+        rows = np.repeat(np.arange(len(user_ids)), np.diff(candidates.indptr))
+        cols = candidates.indices
+        pool_rank = self.pools.pool_rank[cols]
+        order = np.lexsort((pool_rank, self.pools.item_category[cols], rows))
+        group_start = np.r_[True, (np.diff(rows[order]) != 0) | (np.diff(self.pools.item_category[cols][order]) != 0)]
+        starts = np.flatnonzero(group_start)
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        keep = np.sort(order[rank < DEFAULT_POOL_SIZE])
+        rows, cols = rows[keep], cols[keep]
+        has_history = np.diff(browsed.indptr) > 0
+        splits = np.searchsorted(rows, np.arange(1, len(user_ids)))
+        return [np.sort(positions) if has_history[i] else None for i, positions in enumerate(np.split(cols, splits))]
+
+    def score_chunk(self, user_ids, top_n=None):
+        # OUTPUT_COLUMNS rows, ranked top_n (default self.top_n) per user, in user order
+        top_n = self.top_n if top_n is None else top_n
+        collaborative = content_based = [None] * len(user_ids)
+        if self.algorithm != 'content-based':
+            collaborative = self.engine.recommend_many(user_ids, 5)
+        if self.algorithm != 'collaborative':
+            content_based = self.content_based_positions(user_ids)
+            if self.retriever is not None:
+                content_based = [_with_neighbours(positions, self.retriever, user_id, self.index.browsed(user_id),
+                                                  self.index, DEFAULT_POOL_SIZE)
+                                 for user_id, positions in zip(user_ids, content_based)]
+
+        frames = []
+        for user_id, ranked_ids, positions in zip(user_ids, collaborative, content_based):
+            interacted = self.index.interacted(user_id)
+            cf = None
+            if self.algorithm != 'content-based':
+                cf = _collaborative_frame(ranked_ids, interacted, self.interactions, self.content, 5, self.index, self.pools)
+            cbf = None
+            if self.algorithm != 'collaborative':
+                cbf = _content_based_frame(pd.DataFrame() if positions is None else self.content.iloc[positions].copy())
+            recs = _combine_candidates(cf, cbf, (interacted, self.index.browsed(user_id)))
+            recs = recs[['content_id', 'title', 'category', 'popularity', 'source']]
+            recs = self.ranker.rank(recs, interest_set(self.index.user_row(user_id)['interests']), limit=top_n,
+                                    distinct=True).copy()
+            recs.insert(0, 'rank', np.arange(1, len(recs) + 1))
+            recs.insert(0, 'user_id', user_id)
+            frames.append(recs)
+        if not frames:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+_state = None
+
+
+def _init_worker(state):
+    global _state
+    _state = state
+
+
+def _score_chunk(user_ids):
+    return _state.score_chunk(user_ids)
+
+
+def batch_recommendations(users, content, interactions, browsing_history, algorithm='hybrid', top_n=10,
+                          user_ids=None, chunk_size=1000, workers=1, index=None, engine=None, ranker=None, pools=None,
+                          retriever=None):
+    """Yield one DataFrame of ranked top-n recommendations per chunk of users, in user order.
+
+    Columns are OUTPUT_COLUMNS. Ids that are not in users are skipped, as the
+    routes reject them.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm {algorithm!r}; expected one of {ALGORITHMS}")
+    index = index if index is not None else DataIndex(users, content, interactions, browsing_history)
+    if engine is None and algorithm != 'content-based':
+        engine = ItemSimilarity(interactions)
+    ranker = ranker if ranker is not None else Ranker(content)
+    pools = pools if pools is not None else CandidatePools(content, interactions, browsing_history)
+
+    user_ids = users['user_id'].tolist() if user_ids is None else [int(u) for u in user_ids]
+    user_ids = [u for u in user_ids if index.has_user(u)]
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    state = BatchScorer(users, content, interactions, browsing_history, algorithm, top_n, index, engine, ranker, pools,
+                        retriever)
+
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield state.score_chunk(chunk)
+        return
+
+    context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(state,)) as pool:
+        yield from pool.map(_score_chunk, chunks)
+
+
+def write_batch_recommendations(output, frames):
+    """Stream chunk frames to a .csv or .parquet file; returns the number of rows written."""
+    rows = 0
+    if output.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Writing Parquet needs pyarrow (pip install pyarrow)") from exc
+        writer = None
+        try:
+            for frame in frames:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    header = True
+    with open(output, 'w', newline='') as f:
+        for frame in frames:
+            frame.to_csv(f, index=False, header=header)
+            header = False
+            rows += len(frame)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score recommendations for all users offline.")
+    parser.add_argument('--data-dir', default='.', help="directory holding the four CSV files")
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default='hybrid')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--user-ids', help="comma-separated ids; default is every user")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default='recommendations.csv', help=".csv or .parquet")
+    parser.add_argument('--embeddings', help="embedding index (embeddings.py build) to add to content-based candidates")
+    args = parser.parse_args(argv)
+
+    def load(name):
+        return pd.read_csv(os.path.join(args.data_dir, name))
+
+    user_ids = [int(u) for u in args.user_ids.split(',')] if args.user_ids else None
+    content = load('content.csv')
+    retriever = load_retriever(args.embeddings, content) if args.embeddings else None
+    frames = batch_recommendations(load('users.csv'), content, load('interactions.csv'),
+                                   load('browsing_history.csv'), algorithm=args.algorithm, top_n=args.top_n,
+                                   user_ids=user_ids, chunk_size=args.chunk_size, workers=args.workers,
+                                   retriever=retriever)
+    rows = write_batch_recommendations(args.output, frames)
+    print(f"Wrote {rows} recommendations to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
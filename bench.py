@@ -0,0 +1,225 @@
+"""Latency, throughput and memory benchmarks for the recommenders and routes.
+
+Runs against any data directory in the repo's CSV format (or a columnar store),
+typically one written by synthetic.py, and saves results as JSON so runs on
+different commits can be compared:
+
+    python synthetic.py --users 100000 --out-dir bench_data
+    python bench.py --data-dir bench_data --requests 500 --output bench_results.json
+    python bench.py --data-dir bench_data --compare bench_results.json
+
+--compare exits non-zero when a p50 or p99 got slower than --threshold times
+the baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _summary(latencies, elapsed):
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'calls': len(ms),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'throughput_per_s': round(len(ms) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def run_benchmark(fn, user_ids, warmup=5, trace_memory=False):
+    """Call fn(user_id) for every id in turn; latency percentiles, throughput and memory."""
+    for user_id in user_ids[:warmup]:
+        fn(user_id)
+    latencies = []
+    started = time.perf_counter()
+    for user_id in user_ids:
+        t0 = time.perf_counter()
+        fn(user_id)
+        latencies.append(time.perf_counter() - t0)
+    result = _summary(latencies, time.perf_counter() - started)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    if trace_memory:
+        # Separate pass: tracemalloc slows every allocation down, so it must not touch the timings
+        tracemalloc.start()
+        for user_id in user_ids[:max(1, len(user_ids) // 10)]:
+            fn(user_id)
+        result['peak_alloc_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    return result
+
+
+def run_load_test(app, requests, concurrency):
+    """Fire (method, url, data) requests from `concurrency` threads, each with its own test client."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def worker(batch):
+        nonlocal errors
+        client = app.test_client()
+        local, failed = [], 0
+        for method, url, data in batch:
+            t0 = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            local.append(time.perf_counter() - t0)
+            failed += response.status_code >= 400
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [requests[i::concurrency] for i in range(concurrency)]))
+    result = _summary(latencies, time.perf_counter() - started)
+    result.update(concurrency=concurrency, errors=errors, peak_rss_mb=_peak_rss_mb())
+    return result
+
+
+def run(data_dir, store_dir=None, requests=200, algorithm='hybrid', concurrency=8, seed=0, trace_memory=False):
+    # app.py loads its data at import time from these
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['DATA_STORE'] = store_dir or os.path.join(data_dir, 'data_store')
+    started = time.perf_counter()
+    import app as web
+    import model
+    from cache import LocalBackend, RecommendationCache
+    startup = round(time.perf_counter() - started, 3)
+    startup_rss = _peak_rss_mb()
+
+    snap = web.ingestor.snapshot
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(snap.users['user_id'].to_numpy(), size=requests).tolist()
+    client = web.app.test_client()
+
+    benchmarks = {
+        'collaborative_filtering': lambda uid: model.collaborative_filtering(
+            uid, snap.interactions, snap.content, snap.users, index=snap.index, engine=snap.engine, pools=snap.pools),
+        'content_based_filtering': lambda uid: model.content_based_filtering(
+            uid, snap.interactions, snap.browsing_history, snap.content, index=snap.index, pools=snap.pools,
+            retriever=snap.retriever),
+        'hybrid_recommendation': lambda uid: model.hybrid_recommendation(
+            uid, snap.interactions, snap.browsing_history, snap.content, snap.users,
+            index=snap.index, engine=snap.engine, people=snap.people, pools=snap.pools, retriever=snap.retriever),
+        'recommend_users_to_follow': lambda uid: model.recommend_users_to_follow(
+            uid, snap.users, snap.interactions, people=snap.people),
+        'route_recommend': lambda uid: client.post('/recommend', data={'user_id': uid, 'algorithm': algorithm}),
+        'route_recommend_auto': lambda uid: client.get(f'/recommend_auto?user_id={uid}&algorithm={algorithm}'),
+    }
+
+    results = {}
+    # Routes are measured uncached first (a zero-byte cache stores nothing), then with a warm cache
+    cache = web.service.cache
+    web.service.cache = RecommendationCache(LocalBackend(max_bytes=0))
+    for name, fn in benchmarks.items():
+        results[name] = run_benchmark(fn, user_ids, trace_memory=trace_memory)
+        print(f"{name:32s} p50 {results[name]['p50_ms']:9.3f} ms  p99 {results[name]['p99_ms']:9.3f} ms  "
+              f"{results[name]['throughput_per_s']} /s", file=sys.stderr)
+    web.service.cache = cache
+    for uid in set(user_ids):
+        benchmarks['route_recommend_auto'](uid)
+    results['route_recommend_auto_cached'] = run_benchmark(benchmarks['route_recommend_auto'], user_ids)
+
+    web.service.cache = RecommendationCache(LocalBackend(max_bytes=0))
+    load = [('GET', f'/recommend_auto?user_id={uid}&algorithm={algorithm}', None) for uid in user_ids]
+    load_test = run_load_test(web.app, load, concurrency)
+    web.service.cache = cache
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'data_dir': data_dir,
+            'rows': {'users': len(snap.users), 'content': len(snap.content),
+                     'interactions': len(snap.interactions), 'browsing_history': len(snap.browsing_history)},
+            'requests': requests,
+            'algorithm': algorithm,
+        },
+        'startup_seconds': startup,
+        'startup_peak_rss_mb': startup_rss,
+        'benchmarks': results,
+        'load_test': load_test,
+    }
+
+
+def compare(results, baseline, threshold=1.2):
+    """Print per-benchmark p50/p99 ratios against a baseline; returns the names that regressed."""
+    regressed = []
+    old_all = dict(baseline.get('benchmarks', {}), load_test=baseline.get('load_test', {}))
+    new_all = dict(results['benchmarks'], load_test=results['load_test'])
+    print(f"{'benchmark':32s} {'p50 old':>10s} {'p50 new':>10s} {'ratio':>6s} {'p99 old':>10s} {'p99 new':>10s} {'ratio':>6s}")
+    for name, new in new_all.items():
+        old = old_all.get(name)
+        if not old:
+            continue
+        ratios = [new[k] / old[k] if old[k] else float('inf') for k in ('p50_ms', 'p99_ms')]
+        flag = '  REGRESSED' if max(ratios) > threshold else ''
+        if flag:
+            regressed.append(name)
+        print(f"{name:32s} {old['p50_ms']:10.3f} {new['p50_ms']:10.3f} {ratios[0]:6.2f} "
+              f"{old['p99_ms']:10.3f} {new['p99_ms']:10.3f} {ratios[1]:6.2f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recommenders and Flask routes.")
+    parser.add_argument('--data-dir', default='bench_data', help="directory holding the four CSV files")
+    parser.add_argument('--store', help="columnar store to load instead of the CSVs (see store.py)")
+    parser.add_argument('--users', type=int, help="generate this many users into --data-dir first if it is empty")
+    parser.add_argument('--requests', type=int, default=200, help="calls per benchmark")
+    parser.add_argument('--algorithm', default='hybrid', help="algorithm the route benchmarks ask for")
+    parser.add_argument('--concurrency', type=int, default=8, help="threads in the route load test")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help="also report peak Python allocations")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    if args.users and not os.path.exists(os.path.join(args.data_dir, 'users.csv')):
+        from synthetic import generate
+        generate(args.data_dir, args.users, seed=args.seed)
+
+    results = run(args.data_dir, args.store, args.requests, args.algorithm, args.concurrency, args.seed,
+                  args.trace_memory)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Per-user recommendation result cache.
+
+Entries are keyed by (user_id, algorithm, limit) and stored through a
+pluggable backend: LocalBackend is an in-process LRU with TTL and a byte
+budget; RedisBackend wraps any redis-py compatible client so several worker
+processes share one cache. Invalidating a user bumps a per-user generation
+number that is part of every key, so all of that user's entries go stale at
+once without scanning for them; stale entries age out by TTL / LRU.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalBackend:
+    """Thread-safe in-process LRU with per-entry TTL and a total size limit in bytes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        # Generation counters live outside the LRU: evicting one would resurrect stale entries
+        self._counters = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ex=None):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ex if ex else None, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def size(self):
+        return self._bytes, len(self._entries)
+
+
+class RedisBackend:
+    """Backend on a redis-py compatible client (Redis, KeyDB, a local stand-in ...).
+
+    Eviction and memory limits are the server's: set maxmemory with a
+    volatile-* policy so only the expiring result entries are evicted, never
+    the generation counters (which have no TTL).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0
+
+    @classmethod
+    def from_url(cls, url):
+        import redis  # optional dependency, only needed for a shared cache
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ex=None):
+        self.client.set(key, value, ex=max(1, int(ex)) if ex else None)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def counter(self, key):
+        value = self.client.get(key)
+        return int(value) if value is not None else 0
+
+    def size(self):
+        return None, None
+
+
+class RecommendationCache:
+    """Caches computed recommendation results per (user_id, algorithm, limit)."""
+
+    def __init__(self, backend=None, ttl=300, prefix='rec'):
+        self.backend = backend if backend is not None else LocalBackend()
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, user_id, algorithm, limit):
+        generation = self.backend.counter(f'{self.prefix}:gen:{user_id}')
+        return f'{self.prefix}:{user_id}:{generation}:{algorithm}:{limit}'
+
+    def get(self, user_id, algorithm, limit=None):
+        return self._get(self._key(user_id, algorithm, limit))
+
+    def _get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, user_id, algorithm, limit, result):
+        self._set(self._key(user_id, algorithm, limit), result)
+
+    def _set(self, key, result):
+        self.backend.set(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+
+    def lookup(self, user_id, algorithm, limit=None):
+        """(key, cached result or None). Pass the key to store() once the result is computed."""
+        key = self._key(user_id, algorithm, limit)
+        return key, self._get(key)
+
+    def store(self, key, result):
+        self._set(key, result)
+
+    def get_or_compute(self, user_id, algorithm, limit, compute):
+        # The key is fixed before computing: an invalidation that lands mid-compute
+        # bumps the generation, so the possibly stale result is stored where nobody looks
+        key, result = self.lookup(user_id, algorithm, limit)
+        if result is None:
+            result = compute()
+            self._set(key, result)
+        return result
+
+    def get_or_compute_many(self, user_ids, algorithm, limit, compute_many):
+        """get_or_compute for many users: compute_many(missing_ids) -> {user_id: result} runs once, for the misses."""
+        keys = {user_id: self._key(user_id, algorithm, limit) for user_id in user_ids}
+        results = {user_id: self._get(key) for user_id, key in keys.items()}
+        missing = [user_id for user_id, result in results.items() if result is None]
+        if missing:
+            computed = compute_many(missing)
+            for user_id in missing:
+                results[user_id] = computed[user_id]
+                self._set(keys[user_id], computed[user_id])
+        return results
+
+    def invalidate(self, user_ids):
+        """Drop every cached result for these users (their interactions, browsing or follows changed)."""
+        for user_id in user_ids:
+            self.backend.incr(f'{self.prefix}:gen:{user_id}')
+            self.invalidations += 1
+
+    def stats(self):
+        size_bytes, entries = self.backend.size()
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                'evictions': self.backend.evictions, 'bytes': size_bytes, 'entries': entries}
+
+
+def cache_from_env():
+    # REDIS_URL shares one cache across workers; otherwise each process keeps its own LRU
+    ttl = float(os.environ.get('REC_CACHE_TTL', '300'))
+    url = os.environ.get('REDIS_URL')
+    if url:
+        return RecommendationCache(RedisBackend.from_url(url), ttl=ttl)
+    max_bytes = int(os.environ.get('REC_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    return RecommendationCache(LocalBackend(max_bytes=max_bytes), ttl=ttl)
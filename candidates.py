@@ -0,0 +1,155 @@
+"""Precomputed candidate pools, kept as sorted arrays.
+
+- global: content ids by interaction count (what value_counts() gave)
+- trending: content ids by browsing events with exponential time decay
+- per category: catalogue positions by the `popularity` column, the same
+  order the Ranker uses within a category, so cutting a pool to its first n
+  never drops an item the ranker would have put above one that was kept
+
+Events are queued by add_interactions() / add_browsing() and folded in by
+refresh(), either on every call or from a background thread (start()).
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_HALF_LIFE_HOURS = 24.0 * 7
+
+
+def _timestamps(values):
+    return pd.to_datetime(pd.Series(values), errors='coerce').to_numpy(dtype='datetime64[s]')
+
+
+class CandidatePools:
+    """Popularity rankings and per-category candidate pools for content-based filtering.
+
+    Time decay is measured from the newest browsing event seen so far rather
+    than the wall clock, so a static dataset does not decay to nothing; that
+    reference never runs ahead of the clock, so a future-dated event cannot
+    decay every other weight to 0.
+    """
+
+    def __init__(self, content, interactions, browsing_history, half_life_hours=DEFAULT_HALF_LIFE_HOURS,
+                 refresh_interval=None):
+        self.content_ids = pd.Index(content['content_id'].to_numpy())
+        self.half_life = np.timedelta64(int(half_life_hours * 3600), 's')
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._pending_interactions = []
+        self._pending_browsing = []
+
+        # Category pools: NaN is a category of its own, as in an isin() mask
+        self.item_category, _ = pd.factorize(content['category'], use_na_sentinel=False)
+        n_items = len(content)
+        popularity = content['popularity'].to_numpy(dtype=np.float64)
+        order = np.lexsort((np.arange(n_items), -popularity, self.item_category))
+        starts = np.flatnonzero(np.r_[True, np.diff(self.item_category[order]) != 0]) if n_items else order
+        self.category_pools = dict(zip(self.item_category[order[starts]].tolist(), np.split(order, starts[1:])))
+        # Rank of every item inside its own pool, for cutting many users' candidates at once (batch.py)
+        self.pool_rank = np.empty(n_items, dtype=np.int64)
+        self.pool_rank[order] = np.arange(n_items) - np.repeat(starts, np.diff(np.r_[starts, n_items]))
+
+        self._counts = interactions['content_id'].value_counts()
+        self._popular = self._counts.index.to_numpy()
+        self._decayed = pd.Series(dtype=np.float64)
+        self._reference = None
+        self._trending = self._decayed.index.to_numpy()
+        self._fold_browsing(browsing_history['content_id'].to_numpy(), _timestamps(browsing_history['timestamp']))
+
+    def popular_ids(self, n):
+        # Most interacted-with content ids, same order as interactions['content_id'].value_counts()
+        return self._popular[:n]
+
+    def trending_ids(self, n):
+        # Most browsed content ids, each event weighted by 0.5 ** (age / half-life)
+        return self._trending[:n]
+
+    def content_based_positions(self, browsed_ids, n=DEFAULT_POOL_SIZE):
+        """Catalogue positions of the top n unbrowsed items of every category the user browsed.
+
+        Returned in catalogue order; None when no browsed id is in the catalogue.
+        """
+        browsed = self.content_ids.get_indexer(np.asarray(browsed_ids))
+        browsed = browsed[browsed >= 0]
+        if len(browsed) == 0:
+            return None
+        picked = [pool[~np.isin(pool, browsed)][:n]
+                  for pool in (self.category_pools[c] for c in np.unique(self.item_category[browsed]).tolist())]
+        return np.sort(np.concatenate(picked))
+
+    def add_interactions(self, interactions):
+        with self._lock:
+            self._pending_interactions.append(interactions['content_id'].to_numpy())
+        if self.refresh_interval is None:
+            self.refresh()
+
+    def add_browsing(self, browsing_history):
+        with self._lock:
+            self._pending_browsing.append((browsing_history['content_id'].to_numpy(),
+                                           _timestamps(browsing_history['timestamp'])))
+        if self.refresh_interval is None:
+            self.refresh()
+
+    def refresh(self):
+        """Fold queued events into the rankings and publish the new sorted arrays."""
+        with self._lock:
+            interactions, self._pending_interactions = self._pending_interactions, []
+            browsing, self._pending_browsing = self._pending_browsing, []
+            if interactions:
+                delta = pd.Series(np.concatenate(interactions)).value_counts()
+                counts = self._counts
+                order = counts.index.append(delta.index.difference(counts.index))
+                counts = counts.reindex(order, fill_value=0) + delta.reindex(order, fill_value=0)
+                # Stable sort: ties keep their previous order
+                self._counts = counts.sort_values(ascending=False, kind='stable')
+                self._popular = self._counts.index.to_numpy()
+            if browsing:
+                self._fold_browsing(np.concatenate([ids for ids, _ in browsing]),
+                                    np.concatenate([ts for _, ts in browsing]))
+
+    def _fold_browsing(self, content_ids, timestamps):
+        valid = ~np.isnat(timestamps)
+        content_ids, timestamps = content_ids[valid], timestamps[valid]
+        if len(timestamps) == 0:
+            return
+        newest = min(timestamps.max(), np.datetime64(datetime.now().replace(microsecond=0), 's'))
+        reference = newest if self._reference is None else max(self._reference, newest)
+        # Events after the reference count as just happened (weight 1), not more
+        timestamps = np.minimum(timestamps, reference)
+        decayed = self._decayed
+        if self._reference is not None:
+            decayed = decayed * 0.5 ** ((reference - self._reference) / self.half_life)
+        weights = pd.Series(0.5 ** ((reference - timestamps) / self.half_life)).groupby(content_ids).sum()
+        decayed = decayed.add(weights, fill_value=0.0)
+        self._decayed, self._reference = decayed, reference
+        self._trending = decayed.sort_values(ascending=False, kind='stable').index.to_numpy()
+
+    def start(self):
+        if self.refresh_interval is None:
+            return
+
+        def loop():
+            while not self._stopped.wait(self.refresh_interval):
+                self.refresh()
+
+        threading.Thread(target=loop, name='pools-refresh', daemon=True).start()
+
+    def stop(self):
+        # Ends the refresh thread, e.g. once a reloaded model has replaced these pools
+        self._stopped.set()
+
+    def __getstate__(self):
+        # Pickled into model artifacts (artifacts.py); queued events are folded in first
+        self.refresh()
+        state = self.__dict__.copy()
+        del state['_lock'], state['_stopped']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
@@ -0,0 +1,30 @@
+"""Pre-fork production serving: gunicorn -c gunicorn.conf.py app:app
+
+The app (data, indexes, CF engine) is loaded once in the master and the
+workers fork from it, sharing those pages copy-on-write. Background threads
+are started in each worker after the fork, since threads do not survive it.
+Several workers are only allowed for a read-only app (READ_ONLY=1).
+"""
+import os
+
+# Read by app.py at import: leave the background threads to post_fork
+os.environ['DEFER_BACKGROUND'] = '1'
+
+bind = os.environ.get('BIND', '127.0.0.1:5000')
+preload_app = True
+# Ingestion state (the next user id, the live indexes) lives in one process, so an app
+# that accepts events runs one worker and scores in parallel on SCORING_WORKERS instead
+read_only = os.environ.get('READ_ONLY') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 2) if read_only else 1))
+if workers > 1 and not read_only:
+    raise RuntimeError("WEB_CONCURRENCY > 1 needs READ_ONLY=1: workers would hand out the same user ids "
+                       "and miss each other's events. Use SCORING_WORKERS for parallel scoring.")
+# Threads overlap I/O and waiting on the scoring pool; scoring itself holds the GIL
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+timeout = 60
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+_EMPTY = np.array([], dtype=np.int64)
+
+
+def _append_unique(existing, values):
+    # existing followed by the values not already in it, in first-seen order
+    values = pd.unique(np.asarray(values))
+    return np.concatenate([existing, values[~np.isin(values, existing)]]).astype(existing.dtype, copy=False)
+
+
+def _group_unique(df, key, value):
+    # key -> array of unique values, in first-seen order (same as Series.unique())
+    pairs = df[[key, value]].drop_duplicates()
+    if pairs.empty:
+        return {}
+    keys = pairs[key].to_numpy()
+    values = pairs[value].to_numpy()
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return dict(zip(keys[starts].tolist(), np.split(values, starts[1:])))
+
+
+class DataIndex:
+    """Per-user / per-item lookup tables built once at startup.
+
+    Routes and model functions use these instead of masking the full
+    interaction and browsing tables on every request. The add_* methods keep
+    it current as events arrive; each one replaces whole dict values (never
+    mutates an array), so concurrent readers see either the old or the new
+    entry and need no lock.
+    """
+
+    def __init__(self, users, content, interactions, browsing_history):
+        self.users = users
+        self.user_interacted = _group_unique(interactions, 'user_id', 'content_id')
+        self.user_browsed = _group_unique(browsing_history, 'user_id', 'content_id')
+        self.content_users = _group_unique(interactions, 'content_id', 'user_id')
+        self.user_rows = {uid: pos for pos, uid in enumerate(users['user_id'].tolist())}
+        self.added_users = {}
+        self.content_rows = {cid: pos for pos, cid in enumerate(content['content_id'].tolist())}
+
+    def has_user(self, user_id):
+        return user_id in self.user_rows or user_id in self.added_users
+
+    def interacted(self, user_id):
+        return self.user_interacted.get(user_id, _EMPTY)
+
+    def browsed(self, user_id):
+        return self.user_browsed.get(user_id, _EMPTY)
+
+    def users_for(self, content_id):
+        return self.content_users.get(content_id, _EMPTY)
+
+    def user_row(self, user_id):
+        row = self.added_users.get(user_id)
+        if row is not None:
+            return row
+        pos = self.user_rows.get(user_id)
+        return None if pos is None else self.users.iloc[pos]
+
+    def content_positions(self, content_ids):
+        # Sorted so the selected rows keep catalogue order, like an isin() mask
+        rows = self.content_rows
+        return np.array(sorted(rows[c] for c in set(np.asarray(content_ids).tolist()) if c in rows), dtype=np.int64)
+
+    def add_user(self, user_id, row):
+        # row is a dict with the users.csv columns; the users frame itself is not grown
+        self.added_users[user_id] = pd.Series(row)
+
+    def add_interactions(self, interactions):
+        for uid, cids in _group_unique(interactions, 'user_id', 'content_id').items():
+            self.user_interacted[uid] = _append_unique(self.user_interacted.get(uid, _EMPTY), cids)
+        for cid, uids in _group_unique(interactions, 'content_id', 'user_id').items():
+            self.content_users[cid] = _append_unique(self.content_users.get(cid, _EMPTY), uids)
+
+    def add_browsing(self, browsing_history):
+        for uid, cids in _group_unique(browsing_history, 'user_id', 'content_id').items():
+            self.user_browsed[uid] = _append_unique(self.user_browsed.get(uid, _EMPTY), cids)
+
+
+# Helpers that use the index when one is available and fall back to a scan
+# otherwise, so the model functions still work on bare DataFrames.
+
+def user_interactions(user_id, interactions, index=None):
+    if index is not None:
+        return index.interacted(user_id)
+    return interactions[interactions['user_id'] == user_id]['content_id'].unique()
+
+
+def user_browsing(user_id, browsing_history, index=None):
+    if index is not None:
+        return index.browsed(user_id)
+    return browsing_history[browsing_history['user_id'] == user_id]['content_id'].unique()
+
+
+def content_subset(content_ids, content, index=None):
+    if index is not None:
+        return content.iloc[index.content_positions(content_ids)]
+    return content[content['content_id'].isin(content_ids)]
+
+
+def content_in_order(content_ids, content, index=None):
+    # Rows for content_ids in the given (ranked) order; unknown ids are dropped
+    if index is not None:
+        rows = index.content_rows
+        return content.iloc[[rows[c] for c in content_ids.tolist() if c in rows]]
+    return pd.DataFrame({'content_id': content_ids}).merge(content, on='content_id')
+
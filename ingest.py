@@ -0,0 +1,302 @@
+"""Incremental ingestion of interactions, browsing events and signups.
+
+Events are appended to the tables' append-only files (store tail files or the
+CSVs, see store.py) and folded into the live indexes without a restart.
+Per-user lookups and popularity counts update in place immediately; the CF
+engine is updated copy-on-write by a background flush that batches everything
+pending, then published with a single reference swap, so readers never take
+a lock.
+
+Bulk-load a JSONL file (one event per line) into a running app:
+
+    python ingest.py events.jsonl --url http://127.0.0.1:5000
+
+Event shapes:
+
+    {"type": "interaction", "user_id": 1, "content_id": 5, "interaction_type": "liked"}
+    {"type": "browse", "user_id": 1, "content_id": 5, "timestamp": "2025-01-01 10:00:00"}
+    {"type": "signup", "name": "Alex", "interests": ["travel", "food"]}
+"""
+import argparse
+import copy
+import json
+import logging
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ('interaction', 'browse', 'signup')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _timestamp(value, i):
+    # Browse time as stored in browsing_history; missing means now. Times ahead of the
+    # clock are clamped to now: trending decays from the newest event, so one would outweigh all others
+    now = datetime.now().replace(microsecond=0)
+    if value is None or value == '':
+        return now.strftime(TIMESTAMP_FORMAT)
+    if not isinstance(value, str):
+        raise ValueError(f"event {i}: timestamp must be a string like '2025-01-01 10:00:00'")
+    try:
+        parsed = datetime.strptime(value, TIMESTAMP_FORMAT)
+    except ValueError:
+        raise ValueError(f"event {i}: timestamp must look like '2025-01-01 10:00:00'") from None
+    return min(parsed, now).strftime(TIMESTAMP_FORMAT)
+
+
+class Snapshot:
+    """Everything a request reads, published as one reference.
+
+    engine and people are replaced, never changed, so a request holding a
+    Snapshot keeps using the ones it started with. index and pools are
+    shared between snapshots and updated in place (apply_rows); each of
+    their entries is swapped whole, but a request may see some of a batch
+    in them and not the rest.
+    """
+
+    def __init__(self, users, content, interactions, browsing_history, index, engine, people, ranker, pools=None,
+                 retriever=None):
+        # The frames are the data as loaded at startup; later events live in the indexes
+        self.users = users
+        self.content = content
+        self.interactions = interactions
+        self.browsing_history = browsing_history
+        self.index = index
+        self.engine = engine
+        self.people = people
+        self.ranker = ranker
+        self.pools = pools
+        self.retriever = retriever
+
+    def replace(self, **changes):
+        new = copy.copy(self)
+        for name, value in changes.items():
+            setattr(new, name, value)
+        return new
+
+
+class Ingestor:
+    """Validates, persists and applies event batches, and owns the current Snapshot.
+
+    With flush_interval=None the CF engine is updated inside every ingest()
+    call; otherwise start() runs a background thread that folds pending
+    interactions in every flush_interval seconds.
+    """
+
+    def __init__(self, snapshot, tables, flush_interval=None):
+        self.snapshot = snapshot
+        self.tables = tables
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._listeners = []
+        users = snapshot.users
+        self._next_user_id = int(users['user_id'].max()) + 1 if not users.empty else 1
+
+    def _parse(self, events, index):
+        interactions, browsing, signups = [], [], []
+        new_ids = set()
+        for i, event in enumerate(events):
+            if not isinstance(event, dict) or event.get('type') not in EVENT_TYPES:
+                raise ValueError(f"event {i}: 'type' must be one of {EVENT_TYPES}")
+            if event['type'] == 'signup':
+                name = str(event.get('name') or '').strip()
+                if not name:
+                    raise ValueError(f"event {i}: signup needs a name")
+                interests = event.get('interests') or []
+                if isinstance(interests, str):
+                    interests = interests.split(';')
+                if not isinstance(interests, list) or not all(isinstance(t, str) for t in interests):
+                    raise ValueError(f"event {i}: signup interests must be a string or a list of strings")
+                user_id = self._next_user_id + len(signups)
+                signups.append({
+                    'user_id': user_id,
+                    'name': name,
+                    'interests': ';'.join([t.strip().lower() for t in interests if t.strip()]),
+                    'followers_count': 0,
+                    'following': '1' if index.has_user(1) else '',
+                    'activity_level': 'low',
+                })
+                new_ids.add(user_id)
+                continue
+
+            try:
+                user_id, content_id = int(event['user_id']), int(event['content_id'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"event {i}: needs integer user_id and content_id") from None
+            if not (index.has_user(user_id) or user_id in new_ids):
+                raise ValueError(f"event {i}: unknown user_id {user_id}")
+            if content_id not in index.content_rows:
+                raise ValueError(f"event {i}: unknown content_id {content_id}")
+            if event['type'] == 'interaction':
+                interactions.append({'user_id': user_id, 'content_id': content_id,
+                                     'interaction_type': str(event.get('interaction_type') or 'viewed')})
+            else:
+                browsing.append({'user_id': user_id, 'content_id': content_id,
+                                 'timestamp': _timestamp(event.get('timestamp'), i)})
+        return interactions, browsing, signups
+
+    def ingest(self, events):
+        """Apply a batch of events. Raises ValueError (and stores nothing) if any event is invalid.
+
+        Returns counts per type plus the ids assigned to signups.
+        """
+        with self._lock:
+            snap = self.snapshot
+            interactions, browsing, signups = self._parse(events, snap.index)
+
+            # Persist first: the append-only files are what a restart reloads
+            for table, rows in (('users', signups), ('interactions', interactions), ('browsing_history', browsing)):
+                if rows:
+                    self.tables.append(table, rows)
+
+            self._next_user_id += len(signups)
+            interactions_frame = pd.DataFrame(interactions) if interactions else None
+            self.snapshot = apply_rows(snap, interactions_frame, pd.DataFrame(browsing) if browsing else None, signups)
+            if interactions_frame is not None:
+                self._pending.append(interactions_frame)
+
+        self._notify(row['user_id'] for rows in (signups, interactions, browsing) for row in rows)
+        if self.flush_interval is None:
+            self.flush()
+        return {'interaction': len(interactions), 'browse': len(browsing),
+                'signup': [row['user_id'] for row in signups]}
+
+    def subscribe(self, callback):
+        """Call callback(user_ids) whenever what those users would be recommended changes."""
+        self._listeners.append(callback)
+
+    def _notify(self, user_ids):
+        user_ids = list(dict.fromkeys(user_ids))
+        if user_ids:
+            for callback in self._listeners:
+                callback(user_ids)
+
+    def signup(self, name, interests):
+        return self.ingest([{'type': 'signup', 'name': name, 'interests': interests}])['signup'][0]
+
+    def flush(self):
+        """Fold pending interactions into the CF engine and publish the new snapshot."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                engine = self.snapshot.engine
+            if not pending:
+                return
+            # The expensive part runs outside _lock so ingest() is not held up
+            try:
+                engine = engine.with_interactions(pd.concat(pending, ignore_index=True))
+            except Exception:
+                # Put the batch back: it is persisted, so the next flush must still fold it in
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+            with self._lock:
+                self.snapshot = self.snapshot.replace(engine=engine)
+            # Results computed between ingest() and now used the old engine
+            self._notify(user_id for frame in pending for user_id in frame['user_id'].tolist())
+
+    def swap(self, build, catch_up):
+        """Replace the snapshot with build(), e.g. one loaded from a model artifact.
+
+        build() runs without any lock held, so ingestion carries on meanwhile;
+        it must account for every row persisted before it read the tables.
+        catch_up() -> {table: DataFrame} then returns the rows persisted since
+        that read, and runs with ingestion paused: they are folded into the
+        new snapshot, which is published in the same step. Requests already
+        running keep the snapshot they started with. Returns the replaced one.
+        """
+        snapshot = build()
+        with self._flush_lock:
+            with self._lock:
+                rows = catch_up()
+                interactions = rows.get('interactions')
+                snapshot = apply_rows(snapshot, interactions, rows.get('browsing_history'),
+                                      rows['users'].to_dict(orient='records') if 'users' in rows else ())
+                # Everything pending is in the new engine except the caught-up rows; flush() folds those
+                self._pending = [interactions] if interactions is not None and len(interactions) else []
+                old, self.snapshot = self.snapshot, snapshot
+        return old
+
+    def start(self):
+        if self.flush_interval is None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception:
+                    # Keep the thread alive: the batch is retried on the next flush
+                    logger.exception("Ingest flush failed; %d batches still pending", len(self._pending))
+
+        threading.Thread(target=loop, name='ingest-flush', daemon=True).start()
+
+
+def apply_rows(snapshot, interactions=None, browsing=None, signups=()):
+    """Fold persisted rows into a snapshot's indexes and pools; returns the snapshot to publish.
+
+    index and pools are updated in place, the people index is replaced.
+
+    interactions / browsing are DataFrames, signups a list of users.csv row
+    dicts. The CF engine is left to the caller: Ingestor batches it in
+    flush(), a model reload folds everything in at once.
+    """
+    for row in signups:
+        snapshot.index.add_user(row['user_id'], row)
+    if signups:
+        snapshot = snapshot.replace(people=snapshot.people.with_users(signups))
+    if browsing is not None and len(browsing):
+        snapshot.index.add_browsing(browsing)
+        if snapshot.pools is not None:
+            snapshot.pools.add_browsing(browsing)
+    if interactions is not None and len(interactions):
+        snapshot.index.add_interactions(interactions)
+        if snapshot.pools is not None:
+            snapshot.pools.add_interactions(interactions)
+    return snapshot
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def post_events(url, events):
+    request = urllib.request.Request(url.rstrip('/') + '/api/events',
+                                     data='\n'.join(json.dumps(e) for e in events).encode('utf-8'),
+                                     headers={'Content-Type': 'application/x-ndjson'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load JSONL events into a running app.")
+    parser.add_argument('path')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    batch, total = [], 0
+    for event in read_jsonl(args.path):
+        batch.append(event)
+        if len(batch) >= args.batch_size:
+            post_events(args.url, batch)
+            total, batch = total + len(batch), []
+    if batch:
+        post_events(args.url, batch)
+        total += len(batch)
+    print(f"Loaded {total} events")
+
+
+if __name__ == '__main__':
+    main()
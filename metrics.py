@@ -0,0 +1,230 @@
+"""Per-stage timers and counters for the recommend pipeline.
+
+REGISTRY collects stage latencies (a histogram per stage: candidate
+generation, ranking, users-to-follow, render) and counters (requests,
+candidates per source), and renders them in the Prometheus text format for
+the /metrics route. Instrumented code does:
+
+    with REGISTRY.time('ranking'):
+        ...
+
+or decorates a function with @timed('collaborative_filtering').
+
+RequestProfiler runs cProfile around a sampled or explicitly requested
+fraction of requests and writes one .prof file per profiled request.
+"""
+import bisect
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Seconds; the +Inf bucket is implied
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_METRIC = 'recommend_stage_seconds'
+
+
+def _labels(labels):
+    # Sorted so the same labels in any order are one series
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms, keyed by name and labels."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., count, sum]
+        self._collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            if slot < len(self.buckets):
+                histogram[slot] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def time(self, stage):
+        """Record the time spent in the block under recommend_stage_seconds{stage=...}."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_METRIC, time.perf_counter() - started, stage=stage)
+
+    def add_collector(self, collect):
+        """Register collect() -> iterable of (name, kind, value), read on every render.
+
+        For state that already keeps its own totals (e.g. the result cache);
+        kind is 'counter' or 'gauge'.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {name} counter')
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {name} histogram')
+            for (n, labels), values in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", repr(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {values[-2]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-1])}')
+        for collect in self._collectors:
+            for name, kind, value in collect():
+                if value is None:
+                    continue
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def drain(self):
+        """Counters and histograms recorded since the last reset / drain, which are cleared.
+
+        Picklable, for merge() into another process's registry (forked scoring workers).
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        return counters, histograms
+
+    def merge(self, delta):
+        counters, histograms = delta
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        histogram[i] += value
+
+
+# Process-wide registry used by model.py and the routes
+REGISTRY = Metrics()
+
+if hasattr(os, 'register_at_fork'):
+    # A forked scoring worker (serving.ScoringPool) must not inherit the lock held by another thread
+    os.register_at_fork(after_in_child=lambda: setattr(REGISTRY, '_lock', threading.Lock()))
+
+
+def timed(stage, registry=None):
+    """Decorator: time every call of the function as `stage`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with (registry or REGISTRY).time(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class RequestProfiler:
+    """cProfile for a sample of requests, or for requests that ask for it.
+
+    sample_rate is the fraction of requests profiled at random; with
+    allow_opt_in a request can also ask for itself (?profile=1). Only one
+    request is profiled at a time, since the interpreter supports a single
+    active profiler; a request that loses that race simply runs unprofiled.
+    """
+
+    def __init__(self, sample_rate=0.0, allow_opt_in=False, output_dir='profiles', top=20):
+        self.sample_rate = sample_rate
+        self.allow_opt_in = allow_opt_in
+        self.output_dir = output_dir
+        self.top = top
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.allow_opt_in
+
+    def start(self, requested=False):
+        """A running profiler if this request should be profiled, else None."""
+        wanted = (requested and self.allow_opt_in) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not wanted or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Some other profiler (a debugger, coverage ...) is already active
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler, label):
+        """Stop the profiler from start(); returns the path of the written .prof file."""
+        if profiler is None:
+            return None
+        profiler.disable()
+        self._busy.release()
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = ''.join(c if c.isalnum() else '_' for c in label.strip('/')) or 'root'
+        path = os.path.join(self.output_dir, f'{name}-{time.time_ns() // 1000}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        if logger.isEnabledFor(logging.INFO):
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+            logger.info("Profiled %s -> %s\n%s", label, path, out.getvalue())
+        return path
+
+
+def profiler_from_env():
+    # PROFILE_SAMPLE_RATE=0.01 profiles 1% of requests; PROFILE_REQUESTS=1 honours ?profile=1
+    return RequestProfiler(sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+                           allow_opt_in=os.environ.get('PROFILE_REQUESTS', '') not in ('', '0'),
+                           output_dir=os.environ.get('PROFILE_DIR', 'profiles'))
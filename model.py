@@ -1,33 +1,49 @@
+import logging
+
+import numpy as np
 import pandas as pd
+from candidates import DEFAULT_POOL_SIZE
+from indexes import user_interactions, user_browsing, content_in_order
+from metrics import timed
+from people import PeopleIndex
+from similarity import ItemSimilarity
+
+logger = logging.getLogger(__name__)
 
-def collaborative_filtering(user_id, interactions, content, users, min_recommendations=5, is_user_based=False):
+@timed('collaborative_filtering')
+def collaborative_filtering(user_id, interactions, content, users, min_recommendations=5, is_user_based=False, index=None, engine=None, pools=None):
     # Find content that the target user has engaged with
-    user_interactions = interactions[interactions['user_id'] == user_id]['content_id'].unique()
-    
+    seen = user_interactions(user_id, interactions, index)
+
+    # Rank unseen items by weighted cosine similarity; build the engine on the fly
+    # when the caller has not precomputed one (slow, fine for one-off calls)
+    if engine is None:
+        engine = ItemSimilarity(interactions)
     if is_user_based:
-        # Implement user-based collaborative filtering logic
-        other_users = interactions[interactions['content_id'].isin(user_interactions)]['user_id'].unique()
-        other_content = interactions[interactions['user_id'].isin(other_users)]['content_id'].unique()
+        ranked_ids, _ = engine.recommend_user_based(user_id, min_recommendations)
     else:
-        # Implement item-based collaborative filtering logic
-        other_content = interactions[interactions['user_id'] != user_id]['content_id'].unique()
+        ranked_ids, _ = engine.recommend(user_id, min_recommendations)
+    return _collaborative_frame(ranked_ids, seen, interactions, content, min_recommendations, index, pools)
 
-    # Exclude content the user has already interacted with
-    recommendations = content[~content['content_id'].isin(user_interactions) & 
-                              content['content_id'].isin(other_content)].copy()
+def _collaborative_frame(ranked_ids, seen, interactions, content, min_recommendations, index=None, pools=None):
+    # Shared with batch.py, which ranks many users at once and then fills each one here
+    recommendations = content_in_order(ranked_ids, content, index).copy()
     recommendations['source'] = 'Collaborative Filtering'
 
     # If fewer than min_recommendations are found, add popular content to fill the gap
     if len(recommendations) < min_recommendations:
-        popular_content_ids = interactions['content_id'].value_counts().index[:min_recommendations]
+        if pools is not None:
+            popular_content_ids = pools.popular_ids(min_recommendations)
+        else:
+            popular_content_ids = interactions['content_id'].value_counts().index[:min_recommendations]
         popular_recommendations = content[content['content_id'].isin(popular_content_ids) & 
-                                          ~content['content_id'].isin(user_interactions)].copy()
+                                          ~content['content_id'].isin(seen)].copy()
         popular_recommendations['source'] = 'Popular Content Fallback'
         recommendations = pd.concat([recommendations, popular_recommendations]).drop_duplicates()
     
     # Further fill with random unseen content if still below min_recommendations
     if len(recommendations) < min_recommendations:
-        unseen_content = content[~content['content_id'].isin(user_interactions)]
+        unseen_content = content[~content['content_id'].isin(seen)]
         random_recommendations = unseen_content.sample(n=min_recommendations - len(recommendations), random_state=42)
         random_recommendations['source'] = 'Random Unseen Content'
         recommendations = pd.concat([recommendations, random_recommendations]).drop_duplicates()
@@ -41,18 +57,43 @@ def collaborative_filtering(user_id, interactions, content, users, min_recommend
     # Return final recommendations limited to min_recommendations
     return recommendations[['content_id', 'title', 'category', 'popularity', 'source']].head(min_recommendations)
 
-def content_based_filtering(user_id, interactions, browsing_history, content):
+@timed('content_based_filtering')
+def content_based_filtering(user_id, interactions, browsing_history, content, index=None, pools=None, pool_size=DEFAULT_POOL_SIZE, retriever=None):
     # User's browsing history of content
-    user_history = browsing_history[browsing_history['user_id'] == user_id]['content_id'].unique()
-    user_content = content[content['content_id'].isin(user_history)]
+    user_history = user_browsing(user_id, browsing_history, index)
+
+    # Recommend similar content by category: the pool_size most popular unseen items of each
+    if pools is not None:
+        positions = pools.content_based_positions(user_history, pool_size)
+        positions = _with_neighbours(positions, retriever, user_id, user_history, index, pool_size)
+        recommendations = pd.DataFrame() if positions is None else content.iloc[positions].copy()
+        return _content_based_frame(recommendations)
 
-    # Recommend similar content by category
+    user_content = content[content['content_id'].isin(user_history)]
     if not user_content.empty:
         recommendations = content[content['category'].isin(user_content['category']) &
-                                  ~content['content_id'].isin(user_history)].copy()
+                                  ~content['content_id'].isin(user_history)]
+        recommendations = (recommendations.sort_values('popularity', ascending=False, kind='stable')
+                           .groupby('category', sort=False, dropna=False).head(pool_size).sort_index().copy())
     else:
         recommendations = pd.DataFrame()  # Return empty if no content in user history
-
+    neighbours = _with_neighbours(None, retriever, user_id, user_history, index, pool_size)
+    if neighbours is not None:
+        recommendations = pd.concat([recommendations, content.iloc[neighbours]]).drop_duplicates(subset=['content_id'])
+    return _content_based_frame(recommendations)
+
+def _with_neighbours(positions, retriever, user_id, user_history, index, k):
+    # Add the k nearest items by embedding (embeddings.EmbeddingIndex) to the category candidates;
+    # the user's interests count too, so users with no browsing history get candidates as well
+    if retriever is None or index is None:
+        return positions
+    row = index.user_row(user_id)
+    neighbours = retriever.recommend(user_history, row['interests'] if row is not None else None, k)
+    if len(neighbours) == 0:
+        return positions
+    return neighbours if positions is None else np.union1d(positions, neighbours)
+
+def _content_based_frame(recommendations):
     # Ensure the necessary columns are present
     required_columns = ['content_id', 'title', 'category', 'popularity']
     missing_columns = [col for col in required_columns if col not in recommendations.columns]
@@ -64,49 +105,49 @@ def content_based_filtering(user_id, interactions, browsing_history, content):
     # Ensure we return the right columns
     return recommendations[['content_id', 'title', 'category', 'popularity', 'source']]
 
-def recommend_users_to_follow(user_id, users, interactions):
-    # Get the interests of the target user
-    user_interests = users.loc[users['user_id'] == user_id, 'interests'].values[0].split(';')
-    user_following = users.loc[users['user_id'] == user_id, 'following'].values[0].split(';')
-    user_following = set(map(int, user_following))  # Convert to set of ints for easy comparison
-
-    # Find users with similar interests, exclude already followed users
-    similar_users = users[users['user_id'] != user_id].copy()  # Exclude current user
-    similar_users['similar_interest_score'] = similar_users['interests'].apply(
-        lambda interests: len(set(interests.split(';')).intersection(user_interests))
-    )
-
-    # Filter out users already followed and sort by interest score and follower count
-    recommended_users = similar_users[~similar_users['user_id'].isin(user_following)]
-    recommended_users = recommended_users[recommended_users['similar_interest_score'] > 0]
-    recommended_users = recommended_users.sort_values(by=['similar_interest_score', 'followers_count'], ascending=[False, False])
-
-    # Get top 5 recommended users
-    recommended_users = recommended_users[['user_id', 'name', 'followers_count', 'following', 'interests']].head(5)
-
-    # Preprocess following names (split 'following' IDs and map to names)
-    recommended_users['following_names'] = recommended_users['following'].apply(
-        lambda following: [users.loc[users['user_id'] == int(follow_id), 'name'].values[0] for follow_id in following.split(';')]
-    )
-    
-    # Clean the 'interests' by removing semicolons and replacing with a space or other separator
-    recommended_users['interests'] = recommended_users['interests'].apply(lambda interests: interests.replace(';', ', '))
-
-    # Convert to a list of dictionaries for template rendering
-    return recommended_users.to_dict(orient='records')
-
-def hybrid_recommendation(user_id, interactions, browsing_history, content, users):
+def recommend_candidates(user_id, algorithm, interactions, browsing_history, content, users, index=None, engine=None, pools=None, retriever=None):
+    # Candidate set used by the routes: CF, CBF or both, minus anything already seen
+    if algorithm == 'collaborative':
+        collaborative, content_based = collaborative_filtering(user_id, interactions, content, users, index=index, engine=engine, pools=pools), None
+    elif algorithm == 'content-based':
+        collaborative, content_based = None, content_based_filtering(user_id, interactions, browsing_history, content, index=index, pools=pools, retriever=retriever)
+    else:
+        collaborative = collaborative_filtering(user_id, interactions, content, users, index=index, engine=engine, pools=pools)
+        content_based = content_based_filtering(user_id, interactions, browsing_history, content, index=index, pools=pools, retriever=retriever)
+    seen = (user_interactions(user_id, interactions, index), user_browsing(user_id, browsing_history, index))
+    return _combine_candidates(collaborative, content_based, seen)
+
+def _combine_candidates(collaborative, content_based, seen):
+    if collaborative is None:
+        recommendations = content_based
+    elif content_based is None:
+        recommendations = collaborative
+    else:
+        recommendations = pd.concat([collaborative, content_based]).drop_duplicates()
+    interacted_ids, browsed_ids = seen
+    return recommendations[~recommendations['content_id'].isin(interacted_ids) &
+                           ~recommendations['content_id'].isin(browsed_ids)]
+
+@timed('users_to_follow')
+def recommend_users_to_follow(user_id, users, interactions, people=None, friends_of_friends=False):
+    # Interest overlap via the precomputed PeopleIndex; build one on the fly when
+    # the caller has not (slow, fine for one-off calls)
+    if people is None:
+        people = PeopleIndex(users)
+    return people.recommend(user_id, n=5, friends_of_friends=friends_of_friends)
+
+def hybrid_recommendation(user_id, interactions, browsing_history, content, users, index=None, engine=None, people=None, pools=None, retriever=None):
     # Get collaborative filtering recommendations
-    collaborative_recommendations = collaborative_filtering(user_id, interactions, content, users)
+    collaborative_recommendations = collaborative_filtering(user_id, interactions, content, users, index=index, engine=engine, pools=pools)
     
     # Get content-based filtering recommendations
-    content_based_recommendations = content_based_filtering(user_id, interactions, browsing_history, content)
+    content_based_recommendations = content_based_filtering(user_id, interactions, browsing_history, content, index=index, pools=pools, retriever=retriever)
 
     # Combine both sets of recommendations
     hybrid_recommendations = pd.concat([collaborative_recommendations, content_based_recommendations]).drop_duplicates(subset=['content_id'])
 
     # User's browsing history to exclude already seen content
-    user_history = browsing_history[browsing_history['user_id'] == user_id]['content_id'].unique()
+    user_history = user_browsing(user_id, browsing_history, index)
     unseen_content = content[~content['content_id'].isin(user_history)].copy()
 
     # Add random unseen content to diversify recommendations
@@ -117,7 +158,7 @@ def hybrid_recommendation(user_id, interactions, browsing_history, content, user
     random_recommendations['source'] = 'Random Unseen Content'
 
     # Add popular content (top 5 most engaged content)
-    popular_content = interactions['content_id'].value_counts().index[:5]
+    popular_content = pools.popular_ids(5) if pools is not None else interactions['content_id'].value_counts().index[:5]
     popular_recommendations = content[content['content_id'].isin(popular_content)].copy()
     popular_recommendations['source'] = 'Popular Content'
 
@@ -127,11 +168,13 @@ def hybrid_recommendation(user_id, interactions, browsing_history, content, user
     # Final deduplication and prioritization by recommendation source
     final_recommendations = all_recommendations.drop_duplicates(subset=['content_id'], keep='first')
 
-    # Debugging print to see the final recommendations
-    print("Final Recommendations:\n", final_recommendations[['content_id', 'title', 'source']])
+    # Formatting the frame is the expensive part, so only do it when DEBUG is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final recommendations for user %s:\n%s", user_id,
+                     final_recommendations[['content_id', 'title', 'source']])
 
     # Recommend users to follow
-    users_to_follow = recommend_users_to_follow(user_id, users, interactions)
-    print(f"Users to follow for user {user_id}: {users_to_follow}")
+    users_to_follow = recommend_users_to_follow(user_id, users, interactions, people=people)
+    logger.debug("Users to follow for user %s: %s", user_id, users_to_follow)
 
     return final_recommendations[['content_id', 'title', 'category', 'popularity', 'source']], users_to_follow
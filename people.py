@@ -0,0 +1,152 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from similarity import grow_csr
+
+
+def _split_ids(following):
+    if not isinstance(following, str) or not following:
+        return []
+    return [int(f) for f in following.split(';') if f.strip()]
+
+
+def _split_interests(interests):
+    if not isinstance(interests, str) or not interests:
+        return []
+    return list(dict.fromkeys(interests.split(';')))
+
+
+class PeopleIndex:
+    """Users-to-follow engine built once from users.csv.
+
+    Interests become a users x interests multi-hot matrix whose transpose is
+    the interest -> users inverted index, so one user's overlap with everyone
+    is a single sparse product that only touches users sharing an interest.
+    The follow graph is parsed once into a users x users adjacency matrix.
+    with_users() returns an updated copy, so readers of the old one are never
+    disturbed.
+    """
+
+    def __init__(self, users):
+        self.user_ids = users['user_id'].to_numpy(dtype=np.int64)
+        self.rows = {uid: pos for pos, uid in enumerate(self.user_ids.tolist())}
+        # Signups since the build; each copy owns its dict, so readers never see rows past their arrays
+        self.added_rows = {}
+        self.names = users['name'].to_numpy(dtype=object)
+        self.followers_count = users['followers_count'].to_numpy(dtype=np.float64)
+        self.following_raw = users['following'].to_numpy(dtype=object)
+        self.interests_raw = users['interests'].to_numpy(dtype=object)
+        self.vocabulary = {}
+
+        interest_lists = [_split_interests(v) for v in self.interests_raw]
+        self.interests = self._multi_hot(interest_lists)
+        self.interest_users = self.interests.T.tocsr()
+        self.following = [_split_ids(v) for v in self.following_raw]
+        # Follow edges to ids that are not users (yet) wait in `dangling`, id -> follower rows,
+        # until with_users() adds that id
+        self.follow_graph, self.dangling = self._adjacency_rows(0, {})
+
+    def _multi_hot(self, interest_lists):
+        codes = [[self.vocabulary.setdefault(t, len(self.vocabulary)) for t in tokens] for tokens in interest_lists]
+        lengths = [len(c) for c in codes]
+        rows = np.repeat(np.arange(len(codes)), lengths)
+        cols = np.fromiter((c for row in codes for c in row), dtype=np.int64, count=sum(lengths))
+        return sp.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)),
+                             shape=(len(codes), len(self.vocabulary)))
+
+    def with_users(self, rows):
+        """Copy of the index with new users (dicts with the users.csv columns) added; self is untouched."""
+        new = copy.copy(self)
+        new.added_rows = dict(self.added_rows)
+        new.vocabulary = dict(self.vocabulary)
+        start = len(self.user_ids)
+        tokens = [_split_interests(r['interests']) for r in rows]
+        added = new._multi_hot(tokens)
+        # Earlier rows may predate interests that were new to the vocabulary
+        interests = grow_csr(self.interests, (start, len(new.vocabulary)))
+        new.interests = sp.vstack([interests, added]).tocsr()
+        new.interest_users = new.interests.T.tocsr()
+
+        new.user_ids = np.append(self.user_ids, np.array([r['user_id'] for r in rows], dtype=np.int64))
+        new.names = np.append(self.names, np.array([r['name'] for r in rows], dtype=object))
+        new.followers_count = np.append(self.followers_count, [float(r['followers_count']) for r in rows])
+        new.following_raw = np.append(self.following_raw, np.array([r['following'] for r in rows], dtype=object))
+        new.interests_raw = np.append(self.interests_raw, np.array([r['interests'] for r in rows], dtype=object))
+        new.following = self.following + [_split_ids(r['following']) for r in rows]
+        for pos, r in enumerate(rows, start):
+            new.added_rows[r['user_id']] = pos
+        n = len(new.user_ids)
+        # Users who already followed one of the new ids gain that edge now
+        resolved = {r['user_id'] for r in rows if r['user_id'] in self.dangling}
+        dangling = self.dangling
+        if resolved:
+            dangling = {uid: followers for uid, followers in dangling.items() if uid not in resolved}
+        edges = np.array([(f, new.added_rows[uid]) for uid in resolved for f in self.dangling[uid]],
+                         dtype=np.int64).reshape(-1, 2)
+        waited = sp.csr_matrix((np.ones(len(edges), dtype=np.float32), (edges[:, 0], edges[:, 1])), shape=(n, n))
+        added, new.dangling = new._adjacency_rows(start, dangling)
+        new.follow_graph = grow_csr(self.follow_graph, (n, n)) + added + waited
+        return new
+
+    def _row(self, user_id):
+        pos = self.rows.get(user_id)
+        return self.added_rows.get(user_id) if pos is None else pos
+
+    def _adjacency_rows(self, start, dangling):
+        # Follow edges of users start.. onwards, and dangling plus their edges to unknown ids
+        # (a new dict when there are any, so other copies' dicts are never changed)
+        following = self.following[start:]
+        lengths = [len(f) for f in following]
+        rows = np.repeat(np.arange(start, start + len(following)), lengths)
+        followed = np.fromiter((uid for f in following for uid in f), dtype=np.int64, count=sum(lengths))
+        targets = pd.Index(self.user_ids).get_indexer(followed)
+        known = targets >= 0
+        if not known.all():
+            dangling = dict(dangling)
+            for uid, row in zip(followed[~known].tolist(), rows[~known].tolist()):
+                dangling[uid] = dangling.get(uid, ()) + (row,)
+        n = len(self.user_ids)
+        return (sp.csr_matrix((np.ones(known.sum(), dtype=np.float32), (rows[known], targets[known])), shape=(n, n)),
+                dangling)
+
+    def recommend(self, user_id, n=5, friends_of_friends=False):
+        """Top-n users sharing the most interests, then most followers; already followed excluded.
+
+        With friends_of_friends, users followed by people this user follows are
+        candidates too, ranked after interest overlap by number of mutual follows.
+        """
+        pos = self._row(user_id)
+        if pos is None:
+            return []
+        overlap = sp.csr_matrix(self.interests[pos] @ self.interest_users)
+        scores = pd.Series(overlap.data, index=overlap.indices, dtype=np.float64)
+        mutual = pd.Series(dtype=np.float64)
+        if friends_of_friends:
+            reached = sp.csr_matrix(self.follow_graph[pos] @ self.follow_graph)
+            mutual = pd.Series(reached.data, index=reached.indices, dtype=np.float64)
+
+        candidates = np.union1d(scores.index.to_numpy(), mutual.index.to_numpy()).astype(np.int64)
+        followed = self.follow_graph[pos].indices
+        candidates = candidates[(candidates != pos) & ~np.isin(candidates, followed)]
+        score = scores.reindex(candidates, fill_value=0.0).to_numpy()
+        mutual = mutual.reindex(candidates, fill_value=0.0).to_numpy()
+        keep = (score > 0) | (mutual > 0)
+        candidates, score, mutual = candidates[keep], score[keep], mutual[keep]
+
+        # Ties keep users.csv order
+        order = np.lexsort((candidates, -self.followers_count[candidates], -mutual, -score))[:n]
+        return [self._record(p) for p in candidates[order]]
+
+    def _record(self, pos):
+        interests = self.interests_raw[pos]
+        return {
+            'user_id': int(self.user_ids[pos]),
+            'name': self.names[pos],
+            'followers_count': int(self.followers_count[pos]),
+            'following': self.following_raw[pos],
+            'interests': interests.replace(';', ', ') if isinstance(interests, str) and interests else '',
+            'following_names': [self.names[p] for p in map(self._row, self.following[pos]) if p is not None],
+        }
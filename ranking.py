@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# score = interest * (category in user's interests) + popularity * (popularity / max popularity)
+#         + a small boost by candidate source (CF > CBF > others)
+DEFAULT_WEIGHTS = {'interest': 2.0, 'popularity': 1.0, 'collaborative': 0.2, 'content_based': 0.1}
+
+
+def interest_set(interests):
+    # 'Technology;Science' -> {'technology', 'science'}
+    return set([t.strip().lower() for t in str(interests).split(';') if t.strip()])
+
+
+class Ranker:
+    """Orders candidate content for a user with column-wise NumPy scoring.
+
+    Shared by both recommendation routes and the batch job, so all of them
+    rank the same way.
+    """
+
+    def __init__(self, content, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.max_pop = content['popularity'].max() if 'popularity' in content.columns and not content.empty else 1
+        self._lowered = {}
+
+    def _lower(self, value):
+        # Distinct category strings are few; lowercase each one only once
+        key = self._lowered.get(value)
+        if key is None:
+            key = self._lowered[value] = str(value).strip().lower()
+        return key
+
+    def _source_boost(self, source):
+        src = str(source).lower()
+        if 'collaborative' in src:
+            return self.weights['collaborative']
+        return self.weights['content_based'] if 'content-based' in src else 0.0
+
+    def scores(self, candidates, user_interests):
+        codes, categories = pd.factorize(candidates['category'], use_na_sentinel=False)
+        sim = np.array([self._lower(c) in user_interests for c in categories], dtype=np.float64)[codes]
+
+        popularity = candidates['popularity'].to_numpy(dtype=np.float64)
+        pop = popularity / float(self.max_pop or 1)
+
+        codes, sources = pd.factorize(candidates['source'], use_na_sentinel=False)
+        boost = np.array([self._source_boost(s) for s in sources], dtype=np.float64)[codes]
+
+        return self.weights['interest'] * sim + self.weights['popularity'] * pop + boost
+
+    def rank(self, candidates, user_interests, limit=None, distinct=False):
+        """Candidates sorted by score, then popularity, both descending; top `limit` only if given.
+
+        Equal (score, popularity) rows keep their input order. With distinct,
+        an item suggested by several sources appears once, under the source
+        that scores it highest (CF over CBF).
+        """
+        if candidates.empty:
+            return candidates
+        score = self.scores(candidates, user_interests)
+        popularity = candidates['popularity'].to_numpy(dtype=np.float64)
+        order = np.arange(len(candidates))
+        if distinct:
+            order = order[np.lexsort((order, -popularity, -score))]
+            _, first = np.unique(candidates['content_id'].to_numpy()[order], return_index=True)
+            return candidates.iloc[order[np.sort(first)][:limit]]
+        if limit is not None and limit < len(candidates):
+            # Partial selection: only rows that can reach the top `limit` get sorted
+            kth = np.partition(score, len(score) - limit)[len(score) - limit]
+            order = np.flatnonzero(score >= kth)
+        order = order[np.lexsort((order, -popularity[order], -score[order]))]
+        if limit is not None:
+            order = order[:limit]
+        return candidates.iloc[order]
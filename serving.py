@@ -0,0 +1,217 @@
+"""Concurrent serving of recommendation requests.
+
+RecommendationService sits between the routes and the result cache:
+
+- concurrent misses for the same cache key are coalesced into one computation
+  (SingleFlight), so a burst of requests for one user scores it once;
+- with a ScoringPool, CPU-bound scoring runs on forked worker processes that
+  share the loaded data copy-on-write, so requests stop queueing on the GIL;
+- with a deadline, a request that waits longer gets the fallback (the
+  trending / popularity lists) instead; the computation still finishes and is cached.
+
+Compute functions sent to the pool must be picklable (module-level functions
+or functools.partial of them).
+"""
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from metrics import REGISTRY, STAGE_METRIC
+
+DEFAULT_MAX_STALENESS = 30.0
+
+
+class SingleFlight:
+    """One in-flight computation per key; later callers for that key share its Future."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, start):
+        """Future for key, calling start() -> Future only if nothing is in flight for it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                REGISTRY.inc('recommend_coalesced_total')
+                return future
+            future = self._calls[key] = Future()
+        # start() runs outside the lock: it may compute inline
+        try:
+            inner = start()
+        except BaseException as exc:
+            inner = Future()
+            inner.set_exception(exc)
+        inner.add_done_callback(lambda done: self._finish(key, future, done))
+        return future
+
+    def _finish(self, key, future, done):
+        with self._lock:
+            self._calls.pop(key, None)
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+
+def _reset_metrics():
+    # Pool worker initializer: drop the totals inherited from the parent at fork
+    REGISTRY.reset()
+
+
+def _measured(fn, *args):
+    # Runs in a pool worker: the result plus the metrics it recorded, for the parent to merge
+    return fn(*args), REGISTRY.drain()
+
+
+def _unwrap_measured(future, done):
+    if done.exception() is not None:
+        future.set_exception(done.exception())
+        return
+    result, delta = done.result()
+    REGISTRY.merge(delta)
+    future.set_result(result)
+
+
+def _completed(fn):
+    future = Future()
+    try:
+        future.set_result(fn())
+    except BaseException as exc:
+        future.set_exception(exc)
+    return future
+
+
+class ScoringPool:
+    """Forked worker processes for scoring, recycled as the parent's data changes.
+
+    Workers see the data as it was when they were forked. mark_dirty() (an
+    Ingestor subscriber) records users whose own data changed since then;
+    those are scored in the parent so they see their events immediately. The
+    pool is re-forked once it has dirty users and is older than
+    max_staleness seconds, so everyone else's results lag by about that much.
+    Each re-fork copies the parent's page tables and lets workers fault in
+    pages again, which is costly for a large parent, so keep it well above
+    the ingest flush interval.
+    """
+
+    def __init__(self, workers, max_staleness=DEFAULT_MAX_STALENESS):
+        self.workers = workers
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._executor = None
+        self._forked_at = 0.0
+        self._dirty = set()
+        self._context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else None
+
+    def mark_dirty(self, user_ids):
+        with self._lock:
+            self._dirty.update(user_ids)
+
+    def _current(self):
+        with self._lock:
+            stale = self._dirty and time.monotonic() - self._forked_at >= self.max_staleness
+            if self._executor is None or stale:
+                old, self._executor = self._executor, ProcessPoolExecutor(max_workers=self.workers,
+                                                                          mp_context=self._context,
+                                                                          initializer=_reset_metrics)
+                self._forked_at, self._dirty = time.monotonic(), set()
+                if old is not None:
+                    # Calls already running on the old workers still complete
+                    old.shutdown(wait=False)
+            return self._executor
+
+    def recycle(self):
+        # Fork fresh workers on the next submit, e.g. once a new model has been swapped in
+        with self._lock:
+            old, self._executor = self._executor, None
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def can_serve(self, user_id):
+        # Without fork, workers would have to load their own copy of the data
+        return self._context is not None and user_id not in self._dirty
+
+    def submit(self, fn, *args):
+        """Future for fn(*args) on a worker; stage timers and counters it records land in REGISTRY here."""
+        future = Future()
+        self._submit(_measured, fn, *args).add_done_callback(partial(_unwrap_measured, future))
+        return future
+
+    def _submit(self, fn, *args):
+        executor = self._current()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); fork a fresh pool and retry once
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            return self._current().submit(fn, *args)
+
+
+class RecommendationService:
+    """Cache lookup, then a coalesced computation, bounded by an optional deadline.
+
+    Computations the pool does not take (no pool, or a user with events the
+    workers have not seen) run on a thread pool when there is a deadline, so
+    the request can stop waiting, and inline otherwise.
+    """
+
+    def __init__(self, cache, pool=None, deadline=None, threads=None):
+        self.cache = cache
+        self.pool = pool
+        self.deadline = deadline
+        self._flights = SingleFlight()
+        self._threads = ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 4,
+                                           thread_name_prefix='scoring') if deadline else None
+
+    def get(self, user_id, algorithm, limit, compute, fallback=None):
+        """(result, True), or (fallback(), False) when the deadline passes first.
+
+        compute() produces the result on a miss; it is cached under the key
+        looked up before it ran, like RecommendationCache.get_or_compute.
+        """
+        started = time.monotonic()
+        key, result = self.cache.lookup(user_id, algorithm, limit)
+        if result is not None:
+            return result, True
+        future = self._flights.run(key, lambda: self._start(user_id, key, compute))
+        if self.deadline is None or fallback is None:
+            return future.result(), True
+        try:
+            return future.result(timeout=max(0.0, self.deadline - (time.monotonic() - started))), True
+        except FutureTimeout:
+            REGISTRY.inc('recommend_deadline_exceeded_total')
+            return fallback(), False
+
+    def _start(self, user_id, key, compute):
+        submitted = time.perf_counter()
+        if self.pool is not None and self.pool.can_serve(user_id):
+            future = self.pool.submit(compute)
+        elif self._threads is not None:
+            future = self._threads.submit(compute)
+        else:
+            future = _completed(compute)
+        future.add_done_callback(lambda done: self._store(key, done, submitted))
+        return future
+
+    def _store(self, key, done, submitted):
+        # Covers queueing plus scoring; the stages inside were merged from the worker, if any
+        REGISTRY.observe(STAGE_METRIC, time.perf_counter() - submitted, stage='compute')
+        if done.exception() is None:
+            self.cache.store(key, done.result())
+
+
+def service_from_env(cache):
+    # SCORING_WORKERS=n scores on n forked processes; REQUEST_DEADLINE_MS bounds the wait
+    workers = int(os.environ.get('SCORING_WORKERS', '0'))
+    deadline_ms = float(os.environ.get('REQUEST_DEADLINE_MS', '0'))
+    max_staleness = float(os.environ.get('SCORING_MAX_STALENESS', DEFAULT_MAX_STALENESS))
+    pool = ScoringPool(workers, max_staleness) if workers > 0 else None
+    return RecommendationService(cache, pool=pool, deadline=deadline_ms / 1000.0 if deadline_ms > 0 else None)
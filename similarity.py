@@ -0,0 +1,230 @@
+import copy
+
+import numpy as np
+import scipy.sparse as sp
+
+# A like says more about taste than a view; unknown types count as a view
+INTERACTION_WEIGHTS = {'liked': 2.0, 'viewed': 1.0}
+DEFAULT_WEIGHT = 1.0
+
+
+def _ranked_entries(block, k):
+    # Row, column and value of the k largest entries of every row of a CSR block,
+    # best first within each row (ties go to the lower column); no per-row loop
+    block = block.tocsr()
+    block.eliminate_zeros()
+    counts = np.diff(block.indptr)
+    rows = np.repeat(np.arange(block.shape[0]), counts)
+    order = np.lexsort((block.indices, -block.data, rows))
+    rank = np.arange(len(order)) - block.indptr[rows[order]]
+    keep = order[rank < k]
+    return rows[keep], block.indices[keep], block.data[keep]
+
+
+def _top_k_per_row(block, k):
+    rows, cols, data = _ranked_entries(block, k)
+    return sp.csr_matrix((data, (rows, cols)), shape=block.shape)
+
+
+def _top_n(cols, scores, n):
+    # Highest-scoring n columns, best first, without sorting the whole candidate set
+    if n < len(scores):
+        # Everything tied with the n-th best is kept so ties always go to the lower column
+        kth = np.partition(scores, len(scores) - n)[len(scores) - n]
+        part = np.flatnonzero(scores >= kth)
+    else:
+        part = np.arange(len(scores))
+    part = part[np.lexsort((cols[part], -scores[part]))][:n]
+    return cols[part], scores[part]
+
+
+def grow_csr(matrix, shape):
+    # Same CSR data with extra empty rows/columns; no copy of the stored entries
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+def _codes(codes, ids):
+    # Code of every id, ids not in codes numbered after them; returns (codes, {added id: code})
+    added = {}
+    for i in dict.fromkeys(ids):
+        if i not in codes:
+            added[i] = len(codes) + len(added)
+    return np.array([codes[i] if i in codes else added[i] for i in ids], dtype=np.int64), added
+
+
+def _row_norms(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return norms
+
+
+class ItemSimilarity:
+    """Item-item collaborative filtering over a weighted user x item CSR matrix.
+
+    Cosine neighbours are computed once (top_k per item, in column blocks so
+    the full item x item product is never materialised). Scoring a user is a
+    single sparse row-times-matrix product. with_interactions() folds in new
+    events by recomputing only the similarities of the touched items.
+    """
+
+    def __init__(self, interactions, weights=None, top_k=50, block_size=2048):
+        self.weights = INTERACTION_WEIGHTS if weights is None else weights
+        self.user_ids, user_codes = np.unique(interactions['user_id'].to_numpy(), return_inverse=True)
+        self.item_ids, item_codes = np.unique(interactions['content_id'].to_numpy(), return_inverse=True)
+
+        # Repeated (user, item) events are summed
+        self.matrix = sp.csr_matrix((self._values(interactions), (user_codes, item_codes)),
+                                    shape=(len(self.user_ids), len(self.item_ids)), dtype=np.float32)
+        # Codes of users/items added later are appended, so ids are only sorted up to the first update
+        self.user_codes = {uid: code for code, uid in enumerate(self.user_ids.tolist())}
+        self.item_codes = {cid: code for code, cid in enumerate(self.item_ids.tolist())}
+        self.user_norms = _row_norms(self.matrix)
+        self.item_users = self.matrix.T.tocsr()
+        self.item_norms = _row_norms(self.item_users)
+        self.top_k = top_k
+        self.neighbours = self._neighbours(block_size)
+
+    def _values(self, interactions):
+        return (interactions['interaction_type'].astype(object).map(self.weights)
+                .fillna(DEFAULT_WEIGHT).to_numpy(dtype=np.float32))
+
+    def _neighbours(self, block_size):
+        normalized = (self.matrix @ sp.diags(1.0 / self.item_norms)).tocsc()
+        normalized_t = normalized.T.tocsr()
+
+        n_items = len(self.item_ids)
+        blocks = []
+        for start in range(0, n_items, block_size):
+            stop = min(start + block_size, n_items)
+            block = (normalized_t[start:stop] @ normalized).tocsr()
+            # An item is not its own neighbour
+            block.setdiag(0, k=start)
+            blocks.append(_top_k_per_row(block, self.top_k))
+        if not blocks:
+            return sp.csr_matrix((0, 0), dtype=np.float32)
+        return sp.vstack(blocks).tocsr()
+
+    def with_interactions(self, interactions):
+        """Copy of the engine with new interaction rows folded in; self is left untouched.
+
+        Similarities involving the touched items are recomputed exactly. Other
+        items get those new values patched into their neighbour lists but keep
+        their previous top_k otherwise, so rebuild from scratch now and then.
+        """
+        new = copy.copy(self)
+        users = interactions['user_id'].tolist()
+        items = interactions['content_id'].tolist()
+        user_codes, added_users = _codes(self.user_codes, users)
+        item_codes, added_items = _codes(self.item_codes, items)
+        new.user_ids = np.append(self.user_ids, np.array(list(added_users), dtype=self.user_ids.dtype))
+        new.item_ids = np.append(self.item_ids, np.array(list(added_items), dtype=self.item_ids.dtype))
+
+        shape = (len(new.user_ids), len(new.item_ids))
+        delta = sp.csr_matrix((self._values(interactions), (user_codes, item_codes)), shape=shape, dtype=np.float32)
+        new.matrix = (grow_csr(self.matrix, shape) + delta).tocsr()
+        new.item_users = new.matrix.T.tocsr()
+
+        touched_users = np.unique(user_codes)
+        touched_items = np.unique(item_codes)
+        new.user_norms = np.append(self.user_norms, np.ones(len(added_users)))
+        new.user_norms[touched_users] = _row_norms(new.matrix[touched_users])
+        new.item_norms = np.append(self.item_norms, np.ones(len(added_items)))
+        new.item_norms[touched_items] = _row_norms(new.item_users[touched_items])
+        new.neighbours = new._patched_neighbours(grow_csr(self.neighbours, (shape[1], shape[1])), touched_items)
+        # The code dicts are shared with older copies, which ignore codes beyond their matrix; they
+        # are extended only now, so a failure above leaves this engine consistent with its codes
+        self.user_codes.update(added_users)
+        self.item_codes.update(added_items)
+        return new
+
+    def _patched_neighbours(self, neighbours, touched):
+        n_items = len(self.item_ids)
+        scale = 1.0 / self.item_norms
+        fresh = (sp.diags(scale[touched]) @ (self.item_users[touched] @ self.matrix) @ sp.diags(scale)).tocoo()
+        rows, cols, data = touched[fresh.row], fresh.col, fresh.data
+        not_self = rows != cols
+        rows, cols, data = rows[not_self], cols[not_self], data[not_self]
+
+        in_touched = np.zeros(n_items, dtype=bool)
+        in_touched[touched] = True
+        old = neighbours.tocoo()
+        # Drop every stored similarity involving a touched item, then add the fresh ones in
+        # both directions (the touched rows themselves come only from `fresh`)
+        keep = ~in_touched[old.row] & ~in_touched[old.col]
+        mirrored = ~in_touched[cols]
+        all_rows = np.concatenate([old.row[keep], rows, cols[mirrored]])
+        all_cols = np.concatenate([old.col[keep], cols, rows[mirrored]])
+        all_data = np.concatenate([old.data[keep], data, data[mirrored]])
+
+        # Only rows that gained or lost entries need a new top_k
+        changed = in_touched.copy()
+        changed[cols[mirrored]] = True
+        stale = changed[all_rows]
+        top = _top_k_per_row(sp.csr_matrix((all_data[stale], (all_rows[stale], all_cols[stale])),
+                                           shape=(n_items, n_items)), self.top_k).tocoo()
+        return sp.csr_matrix((np.concatenate([all_data[~stale], top.data]),
+                              (np.concatenate([all_rows[~stale], top.row]), np.concatenate([all_cols[~stale], top.col]))),
+                             shape=(n_items, n_items), dtype=np.float32)
+
+    def user_vector(self, user_id):
+        code = self.user_codes.get(user_id)
+        if code is None or code >= self.matrix.shape[0]:
+            return None
+        return self.matrix[code]
+
+    def _rank(self, row, scores, n):
+        scores = sp.csr_matrix(scores)
+        # Never recommend what the user already has
+        keep = (scores.data > 0) & ~np.isin(scores.indices, row.indices)
+        cols, top_scores = _top_n(scores.indices[keep], scores.data[keep], n)
+        return self.item_ids[cols], top_scores
+
+    def _empty(self):
+        return self.item_ids[:0], np.zeros(0, dtype=np.float32)
+
+    def recommend(self, user_id, n=10):
+        """Item-based: score items by similarity to everything the user touched."""
+        row = self.user_vector(user_id)
+        if row is None or row.nnz == 0:
+            return self._empty()
+        return self._rank(row, row @ self.neighbours, n)
+
+    def recommend_many(self, user_ids, n=10):
+        """Item-based top-n for a batch of users with one sparse matrix product.
+
+        Returns a list of id arrays, one per user, identical to calling
+        recommend() for each user in turn.
+        """
+        codes = np.array([self.user_codes.get(u, -1) for u in user_ids], dtype=np.int64)
+        known = np.flatnonzero((codes >= 0) & (codes < self.matrix.shape[0]))
+        results = [self.item_ids[:0]] * len(codes)
+        if len(known) == 0:
+            return results
+        rows = self.matrix[codes[known]]
+        scores = (rows @ self.neighbours).tocsr()
+        seen = rows.copy()
+        seen.data[:] = 1.0
+        scores = scores - scores.multiply(seen)
+        scores.data[scores.data < 0] = 0.0
+        row_idx, cols, _ = _ranked_entries(scores, n)
+        splits = np.searchsorted(row_idx, np.arange(1, len(known)))
+        for pos, ids in zip(known, np.split(self.item_ids[cols], splits)):
+            results[pos] = ids
+        return results
+
+    def recommend_user_based(self, user_id, n=10):
+        """User-based: weight other users' items by their cosine similarity to this user."""
+        row = self.user_vector(user_id)
+        if row is None or row.nnz == 0:
+            return self._empty()
+        code = self.user_codes[user_id]
+        # Only users sharing at least one item get a non-zero entry
+        overlap = sp.csr_matrix(row @ self.item_users)
+        sims = overlap.data / (self.user_norms[overlap.indices] * self.user_norms[code])
+        sims[overlap.indices == code] = 0.0
+        neighbours = overlap.indices
+        if len(neighbours) > self.top_k:
+            top = np.argpartition(-sims, self.top_k - 1)[:self.top_k]
+            neighbours, sims = neighbours[top], sims[top]
+        return self._rank(row, sp.csr_matrix(sims.reshape(1, -1)) @ self.matrix[neighbours], n)
@@ -0,0 +1,305 @@
+"""Columnar on-disk copy of the four CSV tables.
+
+Each column is its own .npy file: ids and counts as int32, low-cardinality
+strings as int32 codes plus a category list, timestamps as datetime64, and
+free text as one UTF-8 blob with offsets. Numeric and categorical columns are
+opened with mmap, so every worker process shares the same page-cache pages
+and opening the store costs no parsing. Appended rows (signups and every
+ingested event) go to a per-table tail CSV that `compact` folds back in.
+While a table has a tail, frame() concatenates it onto the columns, which
+copies them into private memory: the sharing holds only for a compacted
+store, so the app compacts on startup (app.py, COMPACT_ON_START).
+
+    python store.py build --data-dir . --store data_store
+    python store.py compact --store data_store
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl  # POSIX; without it compact must not run next to an app that appends
+except ImportError:
+    fcntl = None
+
+SCHEMA = {
+    'users': {'user_id': 'id', 'name': 'string', 'interests': 'string', 'followers_count': 'int',
+              'following': 'string', 'activity_level': 'category'},
+    'content': {'content_id': 'id', 'title': 'string', 'category': 'category', 'popularity': 'int',
+                'type': 'category'},
+    'interactions': {'user_id': 'id', 'content_id': 'id', 'interaction_type': 'category'},
+    'browsing_history': {'user_id': 'id', 'content_id': 'id', 'timestamp': 'datetime'},
+}
+TABLES = tuple(SCHEMA)
+MANIFEST = 'manifest.json'
+
+
+def _write_column(path, kind, series):
+    if kind in ('id', 'int'):
+        np.save(path + '.npy', series.to_numpy(dtype=np.int32))
+        return {}
+    if kind == 'datetime':
+        np.save(path + '.npy', pd.to_datetime(series, errors='coerce').to_numpy(dtype='datetime64[s]'))
+        return {}
+    if kind == 'category':
+        # Codes keep pandas' own (smallest) code dtype so they can be wrapped without a copy
+        categorical = pd.Categorical(series)
+        np.save(path + '.npy', categorical.codes)
+        return {'categories': [str(c) for c in categorical.categories]}
+    # string: one UTF-8 blob plus offsets, and a null mask when needed
+    nulls = series.isna().to_numpy()
+    encoded = [b'' if null else str(v).encode('utf-8') for v, null in zip(series.tolist(), nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(path + '.data.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(path + '.offsets.npy', offsets)
+    if nulls.any():
+        np.save(path + '.nulls.npy', nulls)
+    return {}
+
+
+def _read_column(path, kind, meta):
+    if kind in ('id', 'int', 'datetime'):
+        return np.load(path + '.npy', mmap_mode='r')
+    if kind == 'category':
+        codes = np.load(path + '.npy', mmap_mode='r')
+        # validate=False wraps the mmapped codes instead of copying them
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(meta['categories']), validate=False)
+    blob = np.load(path + '.data.npy', mmap_mode='r').tobytes()
+    offsets = np.load(path + '.offsets.npy').tolist()
+    values = [blob[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])]
+    if os.path.exists(path + '.nulls.npy'):
+        for i in np.flatnonzero(np.load(path + '.nulls.npy')):
+            values[i] = np.nan
+    return pd.Series(values)
+
+
+@contextlib.contextmanager
+def _locked(store_dir):
+    # Taken by append() and by the directory swap in write_store(), across processes
+    if fcntl is None:
+        yield
+        return
+    with open(store_dir.rstrip('/') + '.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_csv(source, table, **kwargs):
+    # Text columns stay strings even when a chunk holds only digits (a tail of signups all
+    # following '1' would otherwise come back as ints); missing values stay NaN
+    text = {name: str for name, kind in SCHEMA[table].items() if kind in ('string', 'category')}
+    return pd.read_csv(source, dtype=text, **kwargs)
+
+
+def _csv_rows(path, start, table, resume=None):
+    """Data rows start.. of an append-only CSV with a header line, as (frame, end).
+
+    Only complete lines are read, so a row being appended concurrently is left
+    for the next call. end is (rows, byte offset) just past what was read;
+    passing it back as resume reads on from there instead of rescanning.
+    """
+    with open(path, 'rb') as f:
+        if resume is not None and resume[0] <= start:
+            position, offset = resume
+            f.seek(offset)
+        else:
+            f.readline()
+            position, offset = 0, f.tell()
+        while position < start:
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                break
+            position, offset = position + 1, offset + len(line)
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    columns = list(SCHEMA[table])
+    if position < start or not data:
+        return pd.DataFrame(columns=columns), (position, offset)
+    frame = _read_csv(io.BytesIO(data), table, header=None, names=columns)
+    return frame, (position + len(frame), offset + len(data))
+
+
+def write_store(frames, store_dir, carry=()):
+    """Write {table: DataFrame} to store_dir, replacing whatever was there.
+
+    Files named in carry (tails appended to while the new copy was written)
+    are moved from the old directory into the new one.
+    """
+    tmp_dir = store_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    manifest = {'tables': {}}
+    for table, columns in SCHEMA.items():
+        frame = frames[table]
+        os.makedirs(os.path.join(tmp_dir, table))
+        manifest['tables'][table] = {'rows': len(frame), 'columns': {
+            name: dict(kind=kind, **_write_column(os.path.join(tmp_dir, table, name), kind, frame[name]))
+            for name, kind in columns.items()}}
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    old_dir = store_dir.rstrip('/') + '.old'
+    with _locked(store_dir):
+        for name in carry:
+            if os.path.exists(os.path.join(store_dir, name)):
+                os.replace(os.path.join(store_dir, name), os.path.join(tmp_dir, name))
+        if os.path.isdir(store_dir):
+            os.replace(store_dir, old_dir)
+        os.replace(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def build_store(data_dir='.', store_dir='data_store'):
+    frames = {table: _read_csv(os.path.join(data_dir, table + '.csv'), table) for table in TABLES}
+    write_store(frames, store_dir)
+
+
+class DataStore:
+    """Read side of the columnar store, plus append-only tails for new rows."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    @property
+    def manifest(self):
+        # Re-read every time: compact() may have replaced the directory since
+        with open(os.path.join(self.store_dir, MANIFEST)) as f:
+            return json.load(f)
+
+    def _tail_path(self, table):
+        return os.path.join(self.store_dir, table + '.tail.csv')
+
+    def _compacting_path(self, table):
+        return os.path.join(self.store_dir, table + '.compacting.csv')
+
+    def frame(self, table, tails=None):
+        meta = self.manifest['tables'][table]
+        columns = {name: _read_column(os.path.join(self.store_dir, table, name), col['kind'], col)
+                   for name, col in meta['columns'].items()}
+        # copy=False keeps the mmapped arrays as-is instead of consolidating them into new blocks
+        frame = pd.DataFrame(columns, copy=False)
+        # A tail being compacted holds older rows than the current one
+        for path in tails if tails is not None else (self._compacting_path(table), self._tail_path(table)):
+            if os.path.exists(path):
+                frame = self._with_tail(frame, table, path)
+        return frame
+
+    def _with_tail(self, frame, table, path):
+        tail = _read_csv(path, table)
+        for name, kind in SCHEMA[table].items():
+            if kind == 'category':
+                categories = frame[name].cat.categories.union(tail[name].dropna().unique())
+                frame[name] = frame[name].cat.set_categories(categories)
+                tail[name] = pd.Categorical(tail[name], categories=categories)
+            elif kind == 'datetime':
+                tail[name] = pd.to_datetime(tail[name], errors='coerce').astype(frame[name].dtype)
+            else:
+                tail[name] = tail[name].astype(frame[name].dtype)
+        return pd.concat([frame, tail[list(frame.columns)]], ignore_index=True)
+
+    def frames(self):
+        return tuple(self.frame(table) for table in TABLES)
+
+    def rows_since(self, table, start):
+        """Rows at positions start.. (those appended after a frame() of start rows), read from the tails only."""
+        base = self.manifest['tables'][table]['rows']
+        if start < base:
+            return self.frame(table).iloc[start:].reset_index(drop=True)
+        parts, skip = [], start - base
+        for path in (self._compacting_path(table), self._tail_path(table)):
+            if os.path.exists(path):
+                frame, (rows, _) = _csv_rows(path, skip, table)
+                parts.append(frame)
+                skip = max(0, skip - rows)
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=list(SCHEMA[table]))
+
+    def append(self, table, rows):
+        """Append rows (dicts) to the table's tail file; nothing already on disk is rewritten."""
+        with _locked(self.store_dir):
+            path = self._tail_path(table)
+            pd.DataFrame(rows, columns=list(SCHEMA[table])).to_csv(
+                path, mode='a', header=not os.path.exists(path), index=False)
+
+    def compact(self):
+        """Fold the tail files into the columnar files; False when there was nothing to fold.
+
+        Each tail is renamed aside before it is read, so rows a running app
+        appends meanwhile start a fresh tail, which is carried into the new
+        store rather than deleted with the old one.
+        """
+        # One compact at a time; appends are held up only while the tails are renamed
+        with _locked(self.store_dir + '.compact'):
+            with _locked(self.store_dir):
+                for table in TABLES:
+                    # A .compacting file left by an interrupted compact is folded in as well
+                    if os.path.exists(self._tail_path(table)) and not os.path.exists(self._compacting_path(table)):
+                        os.replace(self._tail_path(table), self._compacting_path(table))
+            if not any(os.path.exists(self._compacting_path(table)) for table in TABLES):
+                return False
+            frames = {table: self.frame(table, tails=(self._compacting_path(table),)) for table in TABLES}
+            write_store(frames, self.store_dir, carry=[table + '.tail.csv' for table in TABLES])
+        return True
+
+class CsvTables:
+    """The plain CSV files behind the same frames()/append() interface as DataStore."""
+
+    def __init__(self, data_dir='.'):
+        self.data_dir = data_dir
+        self._ends = {}  # table -> (inode, (rows, byte offset)) where rows_since() stopped reading
+
+    def frame(self, table):
+        return _read_csv(os.path.join(self.data_dir, table + '.csv'), table)
+
+    def rows_since(self, table, start):
+        """Rows at positions start.. (those appended after a frame() of start rows).
+
+        Reads on from where the previous call stopped, so polling for new
+        rows does not rescan the whole file.
+        """
+        path = os.path.join(self.data_dir, table + '.csv')
+        inode = os.stat(path).st_ino
+        previous = self._ends.get(table)
+        frame, end = _csv_rows(path, start, table,
+                               previous[1] if previous is not None and previous[0] == inode else None)
+        self._ends[table] = (inode, end)
+        return frame
+
+    def frames(self):
+        return tuple(self.frame(table) for table in TABLES)
+
+    def append(self, table, rows):
+        """Append rows (dicts) to the CSV without rewriting it."""
+        pd.DataFrame(rows, columns=list(SCHEMA[table])).to_csv(
+            os.path.join(self.data_dir, table + '.csv'), mode='a', header=False, index=False)
+
+
+def open_tables(store_dir='data_store', data_dir='.'):
+    # The columnar store when it has been built, otherwise the CSVs
+    return DataStore(store_dir) if os.path.isdir(store_dir) else CsvTables(data_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or compact the columnar data store.")
+    parser.add_argument('command', choices=('build', 'compact'))
+    parser.add_argument('--data-dir', default='.', help="directory holding the four CSV files")
+    parser.add_argument('--store', default='data_store')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        build_store(args.data_dir, args.store)
+    else:
+        DataStore(args.store).compact()
+    print(f"Store ready at {args.store}")
+
+
+if __name__ == '__main__':
+    main()
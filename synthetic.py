@@ -0,0 +1,177 @@
+"""Synthetic users / content / interactions / browsing_history CSVs at any scale.
+
+Activity is power-law: a few users generate most events, a few items get most
+of the attention, and follows concentrate on already-popular users. Users
+pick content mostly from their interest categories. Output has the same
+columns and formats as the shipped CSVs, written in chunks of users so 10M
+users never sit in memory at once.
+
+    python synthetic.py --users 100000 --out-dir bench_data
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ['Environment', 'Fashion', 'Food', 'Health', 'Photography', 'Science', 'Self improvement',
+              'Technology', 'Travel']
+FIRST_NAMES = ['John', 'Jane', 'Emily', 'Michael', 'Lisa', 'David', 'Susan', 'Robert', 'Maria', 'James', 'Anna',
+               'Chris', 'Sarah', 'Daniel', 'Laura', 'Kevin', 'Nina', 'Omar', 'Priya', 'Wei']
+LAST_NAMES = ['Doe', 'Smith', 'Johnson', 'Brown', 'White', 'Green', 'Black', 'Davis', 'Garcia', 'Lee', 'Khan',
+              'Martin', 'Lopez', 'Clark', 'Young', 'Patel', 'Chen', 'Nguyen', 'Silva', 'Moore']
+TITLE_WORDS = ['Guide', 'Tips', 'Story', 'Review', 'Ideas', 'Trends', 'Basics', 'Secrets', 'Notes', 'Journal']
+END_TIME = np.datetime64('2025-01-31T00:00:00', 's')
+HISTORY_DAYS = 30
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _power_law(rng, n, alpha, low, high):
+    # Integers in [low, high] with P(x) ~ x ** -alpha (inverse-CDF Pareto sample, capped)
+    return np.minimum(high, np.floor(low * (1.0 - rng.random(n)) ** (-1.0 / (alpha - 1.0)))).astype(np.int64)
+
+
+def _weighted_choice(rng, cumulative, n):
+    return np.searchsorted(cumulative, rng.random(n) * cumulative[-1], side='right')
+
+
+def generate_content(rng, n_content):
+    content_ids = np.arange(1, n_content + 1)
+    categories = rng.integers(0, len(CATEGORIES), n_content)
+    words = rng.integers(0, len(TITLE_WORDS), n_content)
+    return pd.DataFrame({
+        'content_id': content_ids,
+        'title': [f"{CATEGORIES[c]} {TITLE_WORDS[w]} #{i}" for c, w, i in zip(categories, words, content_ids)],
+        'category': np.array(CATEGORIES, dtype=object)[categories],
+        'popularity': _power_law(rng, n_content, 1.8, 10, 1_000_000),
+        'type': np.where(rng.random(n_content) < 0.6, 'post', 'article'),
+    })
+
+
+class _Sampler:
+    # Content picked in proportion to sqrt(popularity), globally or within one category;
+    # raw popularity would hand one viral item most of all traffic
+
+    def __init__(self, content):
+        weights = np.sqrt(content['popularity'].to_numpy(dtype=np.float64))
+        self.global_cumulative = np.cumsum(weights)
+        codes = pd.Categorical(content['category'], categories=CATEGORIES).codes
+        self.by_category = []
+        for code in range(len(CATEGORIES)):
+            positions = np.flatnonzero(codes == code)
+            self.by_category.append((positions, np.cumsum(weights[positions])))
+        self.content_ids = content['content_id'].to_numpy()
+
+    def sample(self, rng, categories):
+        # categories: category code per event, -1 for "anything"
+        positions = np.empty(len(categories), dtype=np.int64)
+        anywhere = categories < 0
+        positions[anywhere] = _weighted_choice(rng, self.global_cumulative, anywhere.sum())
+        for code, (pool, cumulative) in enumerate(self.by_category):
+            mask = categories == code
+            if len(pool) == 0:
+                positions[mask] = _weighted_choice(rng, self.global_cumulative, mask.sum())
+            elif mask.any():
+                positions[mask] = pool[_weighted_choice(rng, cumulative, mask.sum())]
+        return self.content_ids[positions]
+
+
+def _interest_strings(rng, n):
+    # 1-3 distinct interests per user; returns the joined strings and the per-user category codes (-1 padded)
+    picks = np.stack([rng.permutation(len(CATEGORIES))[:3] for _ in range(64)])[rng.integers(0, 64, n)]
+    counts = rng.integers(1, 4, n)
+    picks = np.where(np.arange(3) < counts[:, None], picks, -1)
+    keys, inverse = np.unique(picks, axis=0, return_inverse=True)
+    labels = np.array([';'.join(CATEGORIES[c].lower() for c in key if c >= 0) for key in keys], dtype=object)
+    return labels[inverse.ravel()], picks
+
+
+def _following_strings(rng, user_ids, follower_cumulative, n_users):
+    # Out-degree is power-law; targets are picked in proportion to sqrt(followers_count)
+    degree = _power_law(rng, len(user_ids), 2.5, 1, 1000)
+    sources = np.repeat(user_ids, degree)
+    targets = _weighted_choice(rng, follower_cumulative, len(sources)) + 1
+    keep = sources != targets
+    pairs = np.unique(sources[keep] * (n_users + 1) + targets[keep])
+    sources, targets = pairs // (n_users + 1), pairs % (n_users + 1)
+    splits = np.searchsorted(sources, user_ids, side='right')[:-1]
+    return [';'.join(group) for group in np.split(targets.astype(str), splits)]
+
+
+def generate(out_dir, n_users, n_content=None, seed=0, chunk_size=200_000, interest_bias=0.7):
+    """Write the four CSVs for n_users users into out_dir; returns row counts per table."""
+    rng = np.random.default_rng(seed)
+    n_content = n_content or max(100, n_users // 20)
+    os.makedirs(out_dir, exist_ok=True)
+
+    content = generate_content(rng, n_content)
+    content.to_csv(os.path.join(out_dir, 'content.csv'), index=False)
+    sampler = _Sampler(content)
+
+    followers = _power_law(rng, n_users, 1.9, 1, 5_000_000)
+    follower_cumulative = np.cumsum(np.sqrt(followers))
+    rows = {'users': 0, 'content': n_content, 'interactions': 0, 'browsing_history': 0}
+
+    for start in range(0, n_users, chunk_size):
+        user_ids = np.arange(start + 1, min(start + chunk_size, n_users) + 1)
+        n = len(user_ids)
+        interests, interest_codes = _interest_strings(rng, n)
+        activity = _power_law(rng, n, 2.2, 2, 5000)
+
+        # Interactions: mostly from one of the user's interest categories
+        event_users = np.repeat(np.arange(n), activity)
+        chosen = interest_codes[event_users, rng.integers(0, 3, len(event_users))]
+        chosen[(chosen < 0) | (rng.random(len(event_users)) >= interest_bias)] = -1
+        interactions = pd.DataFrame({
+            'user_id': user_ids[event_users],
+            'content_id': sampler.sample(rng, chosen),
+            'interaction_type': np.where(rng.random(len(event_users)) < 0.3, 'liked', 'viewed'),
+        })
+
+        # Browsing: roughly proportional to interactions, skewed towards recent days
+        browse_counts = np.maximum(1, (activity * rng.uniform(0.3, 1.0, n)).astype(np.int64))
+        browse_users = np.repeat(np.arange(n), browse_counts)
+        chosen = interest_codes[browse_users, rng.integers(0, 3, len(browse_users))]
+        chosen[(chosen < 0) | (rng.random(len(browse_users)) >= interest_bias)] = -1
+        age = (rng.random(len(browse_users)) ** 2 * HISTORY_DAYS * 86400).astype('timedelta64[s]')
+        browsing = pd.DataFrame({
+            'user_id': user_ids[browse_users],
+            'content_id': sampler.sample(rng, chosen),
+            'timestamp': pd.Series(END_TIME - age).dt.strftime(TIMESTAMP_FORMAT),
+        })
+
+        first = rng.integers(0, len(FIRST_NAMES), n)
+        last = rng.integers(0, len(LAST_NAMES), n)
+        users = pd.DataFrame({
+            'user_id': user_ids,
+            'name': [f"{FIRST_NAMES[a]} {LAST_NAMES[b]}" for a, b in zip(first, last)],
+            'interests': interests,
+            'followers_count': followers[user_ids - 1],
+            'following': _following_strings(rng, user_ids, follower_cumulative, n_users),
+            'activity_level': np.select([activity < 5, activity < 20], ['low', 'medium'], 'high'),
+        })
+
+        for table, frame in (('users', users), ('interactions', interactions), ('browsing_history', browsing)):
+            frame.to_csv(os.path.join(out_dir, table + '.csv'), mode='w' if start == 0 else 'a',
+                         header=start == 0, index=False)
+            rows[table] += len(frame)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate power-law synthetic data in the repo's CSV format.")
+    parser.add_argument('--users', type=int, required=True, help="e.g. 10000 up to 10000000")
+    parser.add_argument('--content', type=int, help="default: users / 20, at least 100")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=200_000)
+    parser.add_argument('--out-dir', default='bench_data')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows = generate(args.out_dir, args.users, args.content, args.seed, args.chunk_size)
+    print(f"Wrote {rows} to {args.out_dir} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules are flat files at the repo root, not a package
+sys.path.insert(0, ROOT)
+
+import synthetic  # noqa: E402
+from store import TABLES  # noqa: E402
+
+
+def read_tables(data_dir):
+    return tuple(pd.read_csv(os.path.join(data_dir, table + '.csv')) for table in TABLES)
+
+
+@pytest.fixture(scope='session')
+def synthetic_dir(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('synthetic'))
+    synthetic.generate(path, 300, seed=0)
+    return path
+
+
+@pytest.fixture(scope='session', params=['shipped', 'synthetic'])
+def data_dir(request):
+    # The CSVs shipped with the repo, and power-law synthetic.py data big enough for ties and cold users
+    return ROOT if request.param == 'shipped' else request.getfixturevalue('synthetic_dir')
+
+
+@pytest.fixture(scope='session')
+def tables(data_dir):
+    """(users, content, interactions, browsing_history) as read from data_dir."""
+    return read_tables(data_dir)
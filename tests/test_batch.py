@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from batch import ALGORITHMS, BatchScorer, batch_recommendations
+from candidates import CandidatePools
+from indexes import DataIndex
+from model import recommend_candidates
+from ranking import Ranker, interest_set
+from similarity import ItemSimilarity
+
+TOP_N = 10
+
+
+@pytest.fixture(scope='module')
+def built(tables):
+    users, content, interactions, browsing_history = tables
+    return (DataIndex(users, content, interactions, browsing_history), ItemSimilarity(interactions), Ranker(content),
+            CandidatePools(content, interactions, browsing_history))
+
+
+def online(tables, built, user_id, algorithm):
+    # What app._ranked_recommendations(..., distinct=True) serves to the JSON API
+    users, content, interactions, browsing_history = tables
+    index, engine, ranker, pools = built
+    candidates = recommend_candidates(user_id, algorithm, interactions, browsing_history, content, users,
+                                      index=index, engine=engine, pools=pools)
+    candidates = candidates[['content_id', 'title', 'category', 'popularity', 'source']]
+    ranked = ranker.rank(candidates, interest_set(index.user_row(user_id)['interests']), limit=TOP_N, distinct=True)
+    return list(zip(ranked['content_id'].tolist(), ranked['source'].tolist()))
+
+
+def by_user(frame):
+    return {user_id: list(zip(rows['content_id'].tolist(), rows['source'].tolist()))
+            for user_id, rows in frame.groupby('user_id', sort=False)}
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_batch_matches_online(tables, built, algorithm):
+    users, content, interactions, browsing_history = tables
+    index, engine, ranker, pools = built
+    frames = batch_recommendations(users, content, interactions, browsing_history, algorithm, TOP_N,
+                                   chunk_size=64, index=index, engine=engine, ranker=ranker, pools=pools)
+    batch = by_user(pd.concat(list(frames), ignore_index=True))
+
+    for user_id in users['user_id'].tolist():
+        assert batch.get(user_id, []) == online(tables, built, user_id, algorithm), user_id
+
+
+def test_scorer_reading_browsing_from_index_matches(tables, built):
+    # The bulk API's scorer (browsing_history=None) reads browsing from the index instead
+    users, content, interactions, browsing_history = tables
+    index, engine, ranker, pools = built
+    user_ids = users['user_id'].tolist()[:50]
+    args = ('hybrid', TOP_N, index, engine, ranker, pools)
+
+    from_index = BatchScorer(users, content, interactions, None, *args).score_chunk(user_ids)
+    from_table = BatchScorer(users, content, interactions, browsing_history, *args).score_chunk(user_ids)
+
+    pd.testing.assert_frame_equal(from_index, from_table)
@@ -0,0 +1,143 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from candidates import CandidatePools
+from indexes import DataIndex
+from ingest import Ingestor, Snapshot
+from people import PeopleIndex
+from ranking import Ranker
+from similarity import ItemSimilarity
+from store import TABLES, CsvTables, DataStore, build_store
+
+
+def build_snapshot(frames):
+    # app._build_snapshot without embeddings; top_k covers every item so CF updates are exact
+    users, content, interactions, browsing_history = frames
+    return Snapshot(users, content, interactions, browsing_history,
+                    index=DataIndex(users, content, interactions, browsing_history),
+                    engine=ItemSimilarity(interactions, top_k=len(content)), people=PeopleIndex(users),
+                    ranker=Ranker(content), pools=CandidatePools(content, interactions, browsing_history))
+
+
+@pytest.fixture(params=['csv', 'store'])
+def backend(request, data_dir, tmp_path):
+    # Fresh copies of the tables to append to, behind either implementation
+    if request.param == 'store':
+        build_store(data_dir, str(tmp_path / 'data_store'))
+        return DataStore(str(tmp_path / 'data_store'))
+    for table in TABLES:
+        shutil.copy(os.path.join(data_dir, table + '.csv'), tmp_path)
+    return CsvTables(str(tmp_path))
+
+
+def events(snap):
+    users, content = snap.users, snap.content
+    user_ids = users['user_id'].tolist()
+    content_ids = content['content_id'].tolist()
+    new_id = max(user_ids) + 1
+    batch = [{'type': 'signup', 'name': 'Alex', 'interests': ['travel', 'food']},
+             {'type': 'interaction', 'user_id': new_id, 'content_id': content_ids[0], 'interaction_type': 'liked'},
+             {'type': 'browse', 'user_id': new_id, 'content_id': content_ids[1], 'timestamp': '2025-01-02 10:00:00'}]
+    for i, user_id in enumerate(user_ids[:10]):
+        batch.append({'type': 'interaction', 'user_id': user_id, 'content_id': content_ids[-1 - i % 5]})
+        batch.append({'type': 'browse', 'user_id': user_id, 'content_id': content_ids[i % 7]})
+    return batch
+
+
+def test_ingest_then_restart_matches_live_state(backend):
+    ingestor = Ingestor(build_snapshot(backend.frames()), backend)
+    new_id = ingestor.ingest(events(ingestor.snapshot))['signup'][0]
+    live = ingestor.snapshot
+
+    restarted = build_snapshot(backend.frames())
+
+    user_ids = restarted.users['user_id'].tolist()
+    assert new_id in user_ids
+    for user_id in user_ids:
+        assert live.index.has_user(user_id)
+        assert sorted(live.index.interacted(user_id).tolist()) == sorted(restarted.index.interacted(user_id).tolist())
+        assert sorted(live.index.browsed(user_id).tolist()) == sorted(restarted.index.browsed(user_id).tolist())
+        live_cf, fresh_cf = (dict(zip(*(a.tolist() for a in snap.engine.recommend(user_id, n=10 ** 6))))
+                             for snap in (live, restarted))
+        assert live_cf.keys() == fresh_cf.keys()
+        assert np.allclose([live_cf[c] for c in fresh_cf], list(fresh_cf.values()), rtol=1e-4)
+        assert live.people.recommend(user_id, friends_of_friends=True) == \
+            restarted.people.recommend(user_id, friends_of_friends=True)
+    # Popularity counts and decayed browsing weights, whatever order ties ended up in
+    pd.testing.assert_series_equal(live.pools._counts.sort_index(), restarted.pools._counts.sort_index(),
+                                   check_names=False, check_dtype=False, check_index_type=False)
+    pd.testing.assert_series_equal(live.pools._decayed.sort_index(), restarted.pools._decayed.sort_index(),
+                                   check_names=False, check_index_type=False)
+
+
+@pytest.mark.parametrize('event, message', [
+    ({'type': 'browse', 'timestamp': 12345}, 'timestamp'),
+    ({'type': 'browse', 'timestamp': '2025-01-02'}, 'timestamp'),
+    ({'type': 'interaction', 'content_id': -1}, 'unknown content_id'),
+    ({'type': 'signup', 'name': 'Alex', 'interests': 5}, 'interests'),
+    ({'type': 'unknown'}, 'type'),
+])
+def test_invalid_event_stores_nothing(backend, event, message):
+    ingestor = Ingestor(build_snapshot(backend.frames()), backend)
+    snap = ingestor.snapshot
+    valid = {'type': 'interaction', 'user_id': int(snap.users['user_id'].iloc[0]),
+             'content_id': int(snap.content['content_id'].iloc[0])}
+    sizes = [len(frame) for frame in backend.frames()]
+
+    with pytest.raises(ValueError, match=message):
+        ingestor.ingest([valid, dict(valid, **event)])
+
+    assert [len(frame) for frame in backend.frames()] == sizes
+
+
+def test_future_browse_is_clamped_to_now(backend):
+    ingestor = Ingestor(build_snapshot(backend.frames()), backend)
+    snap = ingestor.snapshot
+    user_id, content_id = int(snap.users['user_id'].iloc[0]), int(snap.content['content_id'].iloc[0])
+
+    ingestor.ingest([{'type': 'browse', 'user_id': user_id, 'content_id': content_id,
+                      'timestamp': '2999-01-01 00:00:00'}])
+
+    stored = pd.to_datetime(backend.frame('browsing_history')['timestamp']).max()
+    assert stored <= pd.Timestamp.now()
+    # Older browsing keeps a non-zero trending weight
+    assert (ingestor.snapshot.pools._decayed > 0).all()
+
+
+def test_failed_flush_keeps_the_batch(backend, monkeypatch):
+    ingestor = Ingestor(build_snapshot(backend.frames()), backend, flush_interval=60)
+    snap = ingestor.snapshot
+    user_id, content_id = int(snap.users['user_id'].iloc[0]), int(snap.content['content_id'].iloc[-1])
+    engine = snap.engine
+    ingestor.ingest([{'type': 'interaction', 'user_id': user_id, 'content_id': content_id}])
+
+    def broken(self, neighbours, touched):
+        raise MemoryError
+    monkeypatch.setattr(ItemSimilarity, '_patched_neighbours', broken)
+    with pytest.raises(MemoryError):
+        ingestor.flush()
+    assert ingestor.snapshot.engine is engine
+    assert len(engine.user_codes) == engine.matrix.shape[0]
+
+    monkeypatch.undo()
+    ingestor.flush()
+    assert content_id in ingestor.snapshot.engine.item_codes
+    assert ingestor.snapshot.engine.user_vector(user_id)[0, ingestor.snapshot.engine.item_codes[content_id]] > 0
+
+
+def test_signups_in_batches_match_rebuild(tables):
+    # Earlier users may already follow ids that only sign up later (synthetic.py data does)
+    users = tables[0]
+    split = len(users) // 3
+    people = PeopleIndex(users.iloc[:split])
+    rows = users.iloc[split:].to_dict(orient='records')
+    for start in range(0, len(rows), 37):
+        people = people.with_users(rows[start:start + 37])
+
+    rebuilt = PeopleIndex(users)
+    for user_id in users['user_id'].tolist():
+        assert people.recommend(user_id, friends_of_friends=True) == rebuilt.recommend(user_id, friends_of_friends=True)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from similarity import ItemSimilarity
+
+
+def scored(engine, user_id):
+    # Every scored item, id -> score: engines built differently number items differently,
+    # so the order among equal scores is not comparable, the scores are
+    ids, scores = engine.recommend(user_id, n=len(engine.item_ids))
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+def assert_same_scores(engine, expected, user_ids):
+    for user_id in user_ids:
+        got, want = scored(engine, user_id), scored(expected, user_id)
+        assert got.keys() == want.keys(), user_id
+        assert np.allclose([got[c] for c in want], list(want.values()), rtol=1e-4), user_id
+
+
+@pytest.mark.parametrize('batches', [1, 5])
+def test_with_interactions_matches_rebuild(tables, batches):
+    interactions = tables[2]
+    # top_k covering every item: with_interactions() is exact then (a smaller top_k keeps
+    # untouched items' old neighbour lists, see its docstring)
+    top_k = interactions['content_id'].nunique()
+    split = len(interactions) * 9 // 10
+    engine = ItemSimilarity(interactions.iloc[:split], top_k=top_k)
+    for part in np.array_split(np.arange(split, len(interactions)), batches):
+        engine = engine.with_interactions(interactions.iloc[part].reset_index(drop=True))
+
+    assert_same_scores(engine, ItemSimilarity(interactions, top_k=top_k), interactions['user_id'].unique().tolist())
+
+
+def test_with_interactions_leaves_original_untouched(tables):
+    interactions = tables[2]
+    split = len(interactions) - 10
+    engine = ItemSimilarity(interactions.iloc[:split])
+    before = {user_id: scored(engine, user_id) for user_id in interactions['user_id'].unique().tolist()}
+    new_user = interactions.iloc[split:].assign(user_id=int(interactions['user_id'].max()) + 1)
+
+    engine.with_interactions(new_user.reset_index(drop=True))
+
+    assert engine.user_vector(int(new_user['user_id'].iloc[0])) is None
+    assert {user_id: scored(engine, user_id) for user_id in before} == before
+
+
+def test_recommend_many_matches_recommend(tables):
+    interactions = tables[2]
+    engine = ItemSimilarity(interactions)
+    # Unknown users get an empty list, as recommend() gives
+    user_ids = interactions['user_id'].unique().tolist() + [-1]
+
+    for user_id, ids in zip(user_ids, engine.recommend_many(user_ids, n=10)):
+        assert ids.tolist() == engine.recommend(user_id, n=10)[0].tolist()